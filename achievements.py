@@ -0,0 +1,193 @@
+from datetime import date, datetime
+
+# Başarım & Görev Kuralları
+# Her kural: hangi aktivitelerin sayılacağı (match), hedef (goal) ve ödül (reward).
+# Kurallar açılışta derlenir; her onaylı aktivitede sadece o aktivite tipine bağlı kurallar,
+# karakter üzerinde tutulan küçük bir durumla O(1) güncellenir. Geçmiş yeniden taranmaz.
+#
+# goal.kind:
+#   "count"            -> toplam `target` aktivite
+#   "streak_days"      -> `target` gün üst üste (aynı gün birden fazla sayılmaz)
+#   "count_in_period"  -> bir `period` ("week" / "month") içinde `target` aktivite
+# repeatable: True olan kurallar görevdir; hedefe her ulaşıldığında tekrar ödül verir.
+# Onaylar ve içe aktarmalar eski tarihli olabilir: durumun gününden / döneminden eski
+# aktiviteler seri ve dönem hedeflerini değiştirmez (sadece "count" sayar).
+ACHIEVEMENT_RULES = [
+    {
+        "id": "first_workout",
+        "title": "🏋️ İlk Antrenman",
+        "description": "İlk antrenmanını kaydet",
+        "match": {"type": ["Ağırlık", "Kardiyo", "Yoga/Esneme", "HIIT"]},
+        "goal": {"kind": "count", "target": 1},
+        "reward": {"xp": 100},
+    },
+    {
+        "id": "hydration_streak_7",
+        "title": "💧 Nehir Ruhu",
+        "description": "7 gün üst üste en az 2 LT su iç",
+        "match": {"type": "Hydration", "min_xp": 50},
+        "goal": {"kind": "streak_days", "target": 7},
+        "reward": {"xp": 500, "stats": {"VIT": 10}},
+    },
+    {
+        "id": "walk_streak_5",
+        "title": "👣 Yol Arkadaşı",
+        "description": "5 gün üst üste en az 10k adım",
+        "match": {"type": "Cardio", "min_xp": 50},
+        "goal": {"kind": "streak_days", "target": 5},
+        "reward": {"xp": 400, "stats": {"AGI": 10}},
+    },
+    {
+        "id": "boss_month_3",
+        "title": "👹 Titan Avcısı",
+        "description": "Bir ay içinde 3 Boss Savaşı",
+        "match": {"type": "BossFight"},
+        "goal": {"kind": "count_in_period", "period": "month", "target": 3},
+        "reward": {"xp": 1500, "stats": {"STR": 15}},
+    },
+    {
+        "id": "weekly_workouts_3",
+        "title": "📅 Haftalık Görev",
+        "description": "Bu hafta 3 antrenman yap",
+        "match": {"type": ["Ağırlık", "Kardiyo", "Yoga/Esneme", "HIIT"]},
+        "goal": {"kind": "count_in_period", "period": "week", "target": 3},
+        "reward": {"xp": 200},
+        "repeatable": True,
+    },
+]
+
+# Bu tiplerdeki aktiviteler kurallara girdi olmaz (ödülün kendisi tekrar sayılmasın)
+IGNORED_TYPES = {"Achievement"}
+
+
+class CountGoal:
+    def __init__(self, target):
+        self.target = target
+
+    def update(self, state, day):
+        state["count"] = state.get("count", 0) + 1
+        return state["count"] == self.target
+
+    def progress(self, state, today):
+        return min(state.get("count", 0), self.target), self.target
+
+
+class StreakDaysGoal:
+    def __init__(self, target):
+        self.target = target
+
+    def update(self, state, day):
+        last = state.get("last_day")
+        if last and day.isoformat() <= last:
+            return False
+        if last and (day - date.fromisoformat(last)).days == 1:
+            state["streak"] = state.get("streak", 0) + 1
+        else:
+            state["streak"] = 1
+        state["last_day"] = day.isoformat()
+        return state["streak"] == self.target
+
+    def progress(self, state, today):
+        last = state.get("last_day")
+        alive = last and (today - date.fromisoformat(last)).days <= 1
+        return (min(state.get("streak", 0), self.target) if alive else 0), self.target
+
+
+class PeriodCountGoal:
+    def __init__(self, period, target):
+        self.period = period
+        self.target = target
+
+    def _key(self, day):
+        if self.period == "week":
+            year, week, _ = day.isocalendar()
+            return f"{year}-W{week:02d}"
+        return f"{day.year}-{day.month:02d}"
+
+    def update(self, state, day):
+        key = self._key(day)
+        if state.get("period") and key < state["period"]:
+            return False
+        if state.get("period") != key:
+            state["period"] = key
+            state["count"] = 0
+        state["count"] += 1
+        return state["count"] == self.target
+
+    def progress(self, state, today):
+        count = state.get("count", 0) if state.get("period") == self._key(today) else 0
+        return min(count, self.target), self.target
+
+
+GOAL_TYPES = {
+    "count": lambda goal: CountGoal(goal["target"]),
+    "streak_days": lambda goal: StreakDaysGoal(goal["target"]),
+    "count_in_period": lambda goal: PeriodCountGoal(goal.get("period", "month"), goal["target"]),
+}
+
+
+class Rule:
+    def __init__(self, spec):
+        self.id = spec["id"]
+        self.title = spec["title"]
+        self.description = spec.get("description", "")
+        self.reward = spec.get("reward", {})
+        self.repeatable = spec.get("repeatable", False)
+        match = spec.get("match", {})
+        types = match.get("type")
+        self.types = [types] if isinstance(types, str) else types  # None: tüm tipler
+        self.min_xp = match.get("min_xp", 0)
+        self.goal = GOAL_TYPES[spec["goal"]["kind"]](spec["goal"])
+
+    def matches(self, entry):
+        return int(entry.get("xp_reward", 0) or 0) >= self.min_xp
+
+
+class AchievementEngine:
+    def __init__(self, specs):
+        self.rules = [Rule(spec) for spec in specs]
+        # Aktivite tipine göre kural indeksi: her aktivitede sadece ilgili kurallara bakılır
+        self._by_type = {}
+        self._any_type = []
+        for rule in self.rules:
+            if rule.types is None:
+                self._any_type.append(rule)
+            else:
+                for activity_type in rule.types:
+                    self._by_type.setdefault(activity_type, []).append(rule)
+
+    @staticmethod
+    def new_state():
+        return {"rules": {}, "unlocked": {}}
+
+    def on_approved(self, state, entry):
+        """Onaylanan bir aktiviteyi işler ve yeni kazanılan kuralları döner."""
+        if entry.get("type") in IGNORED_TYPES:
+            return []
+        day = datetime.fromisoformat(entry["date"]).date()
+        unlocked = []
+        for rule in self._by_type.get(entry.get("type"), []) + self._any_type:
+            if rule.id in state["unlocked"] and not rule.repeatable:
+                continue
+            if not rule.matches(entry):
+                continue
+            rule_state = state["rules"].setdefault(rule.id, {})
+            if rule.goal.update(rule_state, day):
+                record = state["unlocked"].setdefault(rule.id, {"date": None, "times": 0})
+                record["date"] = entry["date"][:16]
+                record["times"] += 1
+                unlocked.append(rule)
+        return unlocked
+
+    def summary(self, state, today=None):
+        """Arayüz için: her kural için (kural, kazanıldı mı, ilerleme, hedef)."""
+        today = today or date.today()
+        rows = []
+        for rule in self.rules:
+            record = state["unlocked"].get(rule.id)
+            current, target = rule.goal.progress(state["rules"].get(rule.id, {}), today)
+            rows.append((rule, record, current, target))
+        return rows
+
+
+ACHIEVEMENT_ENGINE = AchievementEngine(ACHIEVEMENT_RULES)
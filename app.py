@@ -1,11 +1,21 @@
+import time
+_import_start = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import os
-import time
 import random
+import uuid
+import base64
+import json
 
-from models import Character, GameSystem, WORKOUT_MULTIPLIERS
+from models import Character, GameSystem, WORKOUT_MULTIPLIERS, WALK_TIERS, DEFAULT_GROUP, HISTORY_PAGE_SIZE, STUDENT_PAGE_SIZE, PROFILE_STARTUP, STARTUP_TIMINGS, startup_timer, record_startup_timing
+from proofs import get_proof_index, proof_owners
+from storage import get_upload_index, STUDENT_UPLOAD_QUOTA_MB
+from sessions import SESSION_TOKEN_PARAM, issue_token, verify_token, revoke_token
+from achievements import ACHIEVEMENT_ENGINE
+
+# pandas/plotly eğitmen panelinde ve öğrencinin Gelişim grafikleri açıldığında, ilk kullanımda import edilir
+record_startup_timing("import: app modules", time.perf_counter() - _import_start)
 
 def get_rpg_loading_msg():
     messages = [
@@ -63,41 +73,262 @@ if 'current_user' not in st.session_state:
 
 # --- Helper Functions ---
 def load_user(name, password):
-    chars = GameSystem.load_characters()
-    if name in chars:
-        char = chars[name]
+    # Sadece bu karakter getirilir; oturumda hafif görünüm (son aktiviteler) tutulur
+    char = GameSystem.load_session_character(name)
+    if char:
         if char.check_password(password):
             st.session_state.current_user = char
+            start_session(char.name)
             return True, "Giriş Başarılı"
         return False, "Hatalı Şifre"
     return False, "Kullanıcı Bulunamadı"
 
-def create_user(name, char_class, password, email, avatar_id):
+def create_user(name, char_class, password, email, avatar_id, group_id=DEFAULT_GROUP):
     # Use explicit keyword arguments to avoid TypeError
     new_char = Character(
         name=name, 
         char_class=char_class, 
         password=password, 
         email=email, 
-        avatar_id=avatar_id
+        avatar_id=avatar_id,
+        group_id=group_id
     )
     GameSystem.save_character(new_char)
     st.session_state.current_user = new_char
+    start_session(name)
+
+def start_session(name):
+    """Girişten sonra imzalı oturum jetonu verir; adres çubuğunda saklanır."""
+    token = issue_token(name)
+    st.session_state.session_token = token
+    st.query_params[SESSION_TOKEN_PARAM] = token
+
+def resume_session(token):
+    """
+    Yeni Streamlit oturumunda jetonla devam eder: imza/süre/iptal kontrolü ve
+    tek anahtarlı karakter sorgusu; şifre tekrar kontrol edilmez.
+    """
+    claims = verify_token(token)
+    char = GameSystem.load_session_character(claims["name"]) if claims else None
+    if char:
+        st.session_state.current_user = char
+        st.session_state.session_token = token
+    else:
+        del st.query_params[SESSION_TOKEN_PARAM]
+
+def end_session():
+    """
+    Çıkış: oturumdaki ve adresteki jeton iptal edilir. Çıkış bağlantısı sayfayı yeniden
+    yüklediği için (yeni Streamlit oturumu) jeton bağlantıda da taşınır.
+    """
+    tokens = {st.session_state.pop("session_token", None), st.query_params.get(SESSION_TOKEN_PARAM)}
+    for token in tokens - {None}:
+        revoke_token(token)
+    st.session_state.current_user = None
+    for key in ("history_page", "history_entries", "history_loaded_page"):
+        st.session_state.pop(key, None)
+    st.query_params.clear()
+
+def save_current_user(idempotency_key=None):
+    char = st.session_state.current_user
+    if char:
+        GameSystem.save_character(char)
+        # Kanıt dosyası ile aktivite arasındaki referans (depolama GC'si için)
+        entry = char.find_by_idempotency_key(idempotency_key) if idempotency_key else None
+        if entry and entry.get("proof_image"):
+            get_upload_index().add_ref(entry["proof_image"], entry["id"])
 
-def save_current_user():
-    if st.session_state.current_user:
-        GameSystem.save_character(st.session_state.current_user)
+def save_upload(uploaded_file, owner, idempotency_key):
+    """
+    Kanıt dosyasını uploads/ altına yazar ve görüntüyse algısal hash'ini indeksler.
+    Dosya adı form anahtarını içerir: tekrar gönderim aynı dosyanın üzerine yazar,
+    farklı öğrencilerin aynı isimli dosyaları birbirini ezmez.
+    Öğrencinin kotası doluysa hata gösterilir ve gönderim durdurulur.
+    """
+    upload_index = get_upload_index()
+    if not upload_index.has_quota(owner, uploaded_file.size):
+        st.error(f"Depolama kotan doldu ({STUDENT_UPLOAD_QUOTA_MB} MB). Eğitmenine başvur.")
+        st.stop()
+    if not os.path.exists("uploads"):
+        os.makedirs("uploads")
+    image_path = os.path.join("uploads", f"{idempotency_key[:8]}_{uploaded_file.name}")
+    with open(image_path, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+    upload_index.register(image_path, owner, uploaded_file.size)
+    get_proof_index().add(image_path, owner)
+    return image_path
+
+def get_form_key(form_name, submitted):
+    """
+    Form başına idempotency anahtarı.
+    Her normal çizimde yeni anahtar üretilir; gönderim sırasında son çizimin anahtarı kullanılır.
+    Böylece çift tıklama veya yeniden bağlanma sonrası tekrar gönderim aynı anahtarı taşır.
+    """
+    state_key = f"idem_{form_name}"
+    if not submitted or state_key not in st.session_state:
+        st.session_state[state_key] = uuid.uuid4().hex
+    return st.session_state[state_key]
 
 # --- Views ---
 
+def get_admin_roster(group_id):
+    """
+    Eğitmenin önbellekteki öğrenci listesi.
+    İlk açılışta bir kez tam yüklenir; sonrasında sadece değişiklik akışındaki deltalar uygulanır.
+    """
+    feed = st.session_state.get("admin_feed")
+    roster = st.session_state.get("admin_roster")
+    if feed is None or roster is None or feed.group_id != group_id or feed.overflowed:
+        feed = GameSystem.subscribe(group_id)
+        roster = GameSystem.load_characters(group_id)
+        st.session_state.admin_feed = feed
+        st.session_state.admin_roster = roster
+        return roster
+    GameSystem.apply_changes(feed, roster)
+    return roster
+
+def student_table_view(group_id):
+    """Genel durum tablosu: filtreler sunucuda uygulanır, sadece istenen sayfa çizilir."""
+    import pandas as pd
+
+    f_name, f_level, f_inactive = st.columns(3)
+    name_query = f_name.text_input("İsim", key="filter_name").strip()
+    fuzzy = f_name.checkbox("Benzer isimleri bul (yazım hatası toleranslı)", key="filter_fuzzy")
+    min_level = f_level.number_input("Min Seviye", min_value=1, value=1, key="filter_min_level")
+    max_level = f_level.number_input("Max Seviye (0 = sınırsız)", min_value=0, value=0, key="filter_max_level")
+    inactive_since = f_inactive.date_input("Şu tarihten beri pasif", value=None, key="filter_inactive")
+
+    stat_cols = st.columns(4)
+    min_stats = {
+        stat: col.number_input(f"Min {stat}", min_value=0, value=0, key=f"filter_{stat}")
+        for stat, col in zip(["STR", "AGI", "VIT", "WIS"], stat_cols)
+    }
+
+    # Filtre değişince ilk sayfaya dön
+    filters = (name_query, fuzzy, min_level, max_level, inactive_since, tuple(min_stats.values()))
+    if st.session_state.get("student_filters") != filters:
+        st.session_state.student_filters = filters
+        st.session_state.student_page = 0
+    page = st.session_state.get("student_page", 0)
+
+    rows, total = GameSystem.search_students(
+        group_id, name_query, fuzzy=fuzzy,
+        min_level=min_level if min_level > 1 else None,
+        max_level=max_level or None,
+        inactive_since=inactive_since,
+        min_stats=min_stats,
+        page=page,
+    )
+    df = pd.DataFrame([{
+        "İsim": row["name"],
+        "Email": row.get("email") or "-",
+        "Seviye": row.get("level"),
+        "XP": row.get("xp"),
+        "STR": row.get("str"),
+        "AGI": row.get("agi"),
+        "VIT": row.get("vit"),
+        "WIS": row.get("wis"),
+        "Son Aktivite": (row.get("last_activity_at") or "Yok")[:16],
+    } for row in rows])
+    st.dataframe(df, use_container_width=True)
+
+    total_pages = max(1, (total + STUDENT_PAGE_SIZE - 1) // STUDENT_PAGE_SIZE)
+    c_prev, c_info, c_next = st.columns(3)
+    if c_prev.button("← Önceki", key="student_prev", disabled=page == 0):
+        st.session_state.student_page = page - 1
+        st.rerun()
+    c_info.caption(f"{total} öğrenci · Sayfa {page + 1} / {total_pages}")
+    if c_next.button("Sonraki →", key="student_next", disabled=page + 1 >= total_pages):
+        st.session_state.student_page = page + 1
+        st.rerun()
+
+def export_view(group_id):
+    """Grubun tüm aktivite geçmişini CSV/Parquet olarak indirme."""
+    from export import ACTIVITY_TYPES, EXPORT_DIR, EXPORT_URL_PREFIX, export_history, remove_stale_exports
+
+    st.subheader("Aktivite Geçmişini Dışa Aktar")
+    st.caption("Kayıtlar veritabanından sayfa sayfa okunup dosyaya akış halinde yazılır.")
+    c_fmt, c_from, c_to = st.columns(3)
+    fmt = c_fmt.selectbox("Format", ["csv", "parquet"])
+    date_from = c_from.date_input("Başlangıç", value=None, key="export_from")
+    date_to = c_to.date_input("Bitiş", value=None, key="export_to")
+    types = st.multiselect("Aktivite Türleri (boş = hepsi)", ACTIVITY_TYPES)
+
+    if st.button("Dosyayı Hazırla"):
+        # Önceki dışa aktarma dosyası silinir
+        old_path = st.session_state.pop("export_path", None)
+        if old_path and os.path.exists(old_path):
+            os.remove(old_path)
+        remove_stale_exports()
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        # Tahmin edilemez dosya adı: statik dizin oturum kontrolü yapmaz
+        path = os.path.join(EXPORT_DIR, f"{uuid.uuid4().hex}.{fmt}")
+        try:
+            with st.spinner(get_rpg_loading_msg()):
+                count = export_history(path, fmt, group_id, date_from, date_to, types)
+            st.session_state.export_path = path
+            st.success(f"{count} aktivite hazırlandı.")
+        except Exception as e:
+            # Veritabanı / pyarrow / disk hatası
+            print(f"Error exporting history: {e}")
+            st.error(f"Dışa aktarma başarısız: {e}")
+        finally:
+            # Yarım kalan dosya statik dizinde sunulmasın (yazım başlamadan da hata olabilir)
+            if st.session_state.get("export_path") != path and os.path.exists(path):
+                os.remove(path)
+
+    path = st.session_state.get("export_path")
+    if path and os.path.exists(path):
+        # Dosya sunucudan diskten akış halinde gönderilir (st.download_button tamamını belleğe alır)
+        file_name = f"aktiviteler_{group_id}{os.path.splitext(path)[1]}"
+        st.markdown(f'<a href="{EXPORT_URL_PREFIX}{os.path.basename(path)}" download="{file_name}">⬇️ İndir</a>', unsafe_allow_html=True)
+
+def storage_view(chars):
+    """Grup öğrencilerinin yükleme kullanımı. Temizlik ve arşiv: python storage.py gc|archive"""
+    stats = get_upload_index().stats(owners=chars.keys())
+    quota = STUDENT_UPLOAD_QUOTA_MB * 1024 * 1024
+    c1, c2 = st.columns(2)
+    c1.metric("Grup Toplamı", f"{sum(stats['usage'].values()) / 1024 / 1024:.1f} MB")
+    c2.metric("Öğrenci Kotası", f"{STUDENT_UPLOAD_QUOTA_MB} MB")
+    st.subheader("Öğrenci Kotaları")
+    for name, used in sorted(stats["usage"].items(), key=lambda item: -item[1]):
+        st.progress(min(used / quota, 1.0), text=f"{name}: {used / 1024 / 1024:.1f} / {STUDENT_UPLOAD_QUOTA_MB} MB")
+
+def startup_profile_view():
+    """Profil modu açıksa ölçülen import/başlatma sürelerini gösterir."""
+    if not (PROFILE_STARTUP or st.query_params.get("profile") == "startup"):
+        return
+    with st.expander("⏱️ Başlangıç Profili"):
+        for label, seconds in STARTUP_TIMINGS.items():
+            st.text(f"{label}: {seconds * 1000:.1f} ms")
+        char = st.session_state.current_user
+        if isinstance(char, Character):
+            # Oturumdaki karakterin serileştirilmiş boyutu (bellek ayak izi için yaklaşık ölçü)
+            size_kb = len(json.dumps(char.to_dict())) / 1024
+            st.text(f"session: current_user ~{size_kb:.1f} KB ({len(char.history)} aktivite bellekte, {char.history_offset} sayfalı)")
+
 def admin_dashboard_view():
+    with startup_timer("import: pandas/plotly"):
+        import pandas as pd
+        import plotly.express as px
+
+    # Eğitmen sadece kendi grubunun karakterleriyle çalışır
+    group_id = st.session_state.get("admin_group", DEFAULT_GROUP)
+
     st.title("👨‍🏫 Eğitmen Kontrol Paneli")
+    st.caption(f"Grup: {group_id}")
     
     if st.button("Çıkış Yap"):
         st.session_state.current_user = None
+        st.session_state.pop("admin_group", None)
+        st.session_state.pop("admin_feed", None)
+        st.session_state.pop("admin_roster", None)
+        export_path = st.session_state.pop("export_path", None)
+        if export_path and os.path.exists(export_path):
+            os.remove(export_path)
         st.rerun()
         
-    chars = GameSystem.load_characters()
+    chars = get_admin_roster(group_id)
     if not chars:
         st.warning("Henüz hiç öğrenci kaydı yok.")
         return
@@ -107,44 +338,47 @@ def admin_dashboard_view():
         st.header("🎁 Hediye Dağıt")
         st.info("Herhangi bir öğrenciye anında XP gönder.")
         
-        student_names = list(chars.keys())
+        # Sunucu tarafı arama: listeye sadece eşleşen ilk sayfa gelir
+        student_query = st.text_input("Öğrenci Ara", placeholder="İsmin başı...")
+        matches, _ = GameSystem.search_students(group_id, student_query.strip(), page_size=20)
+        student_names = [row["name"] for row in matches]
         selected_student = st.selectbox("Öğrenci Seç", student_names)
         gift_message = st.text_input("Mesaj", "Harika gidiyorsun!")
         gift_xp_amount = st.number_input("XP Miktarı", min_value=10, value=100, step=10)
         
-        if st.button("Hediyeyi Gönder"):
-            target_char = chars[selected_student]
+        if st.button("Hediyeyi Gönder") and selected_student:
+            # Sadece seçilen öğrencinin kaydı getirilir
+            target_char = GameSystem.load_character(selected_student)
             target_char.log_activity("Gift", f"🎁 {gift_message}", gift_xp_amount)
             GameSystem.save_character(target_char)
             st.success(f"{selected_student} kişisine {gift_xp_amount} XP gönderildi!")
             st.rerun()
 
-    # Data Preparation
-    data = []
-    for char in chars.values():
-        data.append({
-            "İsim": char.name,
-            "Email": getattr(char, 'email', '-'),
-            "Seviye": char.level,
-            "XP": char.xp,
-            "STR": char.stats.get("STR", 0),
-            "AGI": char.stats.get("AGI", 0),
-            "VIT": char.stats.get("VIT", 0),
-            "WIS": char.stats.get("WIS", 0),
-            "Son Aktivite": char.history[-1]['date'][:16] if char.history else "Yok"
-        })
-    df = pd.DataFrame(data)
+    # Özet metrikler ve dağılım: sadece seviye kolonu okunur (geçmiş taranmaz)
+    df = pd.DataFrame({"Seviye": list(GameSystem.load_group_levels(group_id).values())})
 
     # Top Metrics
-    m1, m2 = st.columns(2)
+    m1, m2, m3 = st.columns(3)
     m1.metric("Toplam Öğrenci", len(df))
     m2.metric("Ortalama Seviye", f"{df['Seviye'].mean():.1f}")
 
+    # Yazma günlüğü: veritabanına henüz aktarılmamış kayıtlar
+    journal = GameSystem.journal_status()
+    m3.metric("Senkron Bekleyen", journal["pending"], f"{journal['lag_seconds']:.0f} sn gecikme" if journal["pending"] else None, delta_color="off")
+    if journal["last_error"]:
+        st.warning(f"Veritabanına aktarım bekliyor: {journal['last_error']}")
+
     # Main Table
-    tab_list, tab_approve = st.tabs(["📊 Genel Durum", "📝 Onay Bekleyenler"])
+    tab_list, tab_approve, tab_export, tab_storage = st.tabs(["📊 Genel Durum", "📝 Onay Bekleyenler", "📤 Dışa Aktar", "🗄️ Depolama"])
+
+    with tab_export:
+        export_view(group_id)
+
+    with tab_storage:
+        storage_view(chars)
 
     with tab_list:
-        st.dataframe(df, use_container_width=True)
+        student_table_view(group_id)
 
         # Charts
         st.subheader("Seviye Dağılımı")
@@ -156,6 +390,10 @@ def admin_dashboard_view():
 
     with tab_approve:
         st.subheader("Onay Bekleyen Aktiviteler")
+        if st.button("🔍 Eski Kanıtları Tara", help="Bu grubun hash'i olmayan kanıtlarını kopya indeksine ekler"):
+            # Sadece bu grubun kanıtları: diğer grupların dosyaları sahipsiz eklenmesin
+            added = get_proof_index().backfill(proof_owners(chars.values()), only_owned=True)
+            st.success(f"{added} kanıt indekslendi.")
         pending_found = False
         for char_name, char in chars.items():
             for i, activity in enumerate(char.history):
@@ -165,8 +403,16 @@ def admin_dashboard_view():
                         col_img, col_info = st.columns([1, 2])
                         with col_img:
                             img_path = activity.get("proof_image")
-                            if img_path and os.path.exists(img_path):
+                            if img_path and get_upload_index().exists(img_path):
                                 st.image(img_path, caption="Kanıt")
+                                # Yakın kopya kontrolü (BK-tree, tüm öğrenciler)
+                                for match in get_proof_index().near_duplicates(img_path):
+                                    # Eşleşme tüm gruplarda aranır; başka grupların öğrenci adları gösterilmez
+                                    if match["owner"] in chars:
+                                        st.warning(f"⚠️ Benzer kanıt: {match['owner']} · {os.path.basename(match['path'])} (fark: {match['distance']})")
+                                    else:
+                                        source = "başka bir gruptan" if match["owner"] else "sahibi bilinmeyen"
+                                        st.warning(f"⚠️ Benzer kanıt: {source} bir yükleme (fark: {match['distance']})")
                             else:
                                 st.warning("Dosya bulunamadı veya silinmiş.")
                         with col_info:
@@ -268,7 +514,6 @@ def onboarding_view():
             if login_submitted:
                 success, msg = load_user(existing_name, existing_password)
                 if success:
-                    st.session_state.current_user = GameSystem.load_characters().get(existing_name)
                     st.success(f"{msg} - Hoşgeldin!")
                     st.rerun()
                 else:
@@ -280,6 +525,7 @@ def onboarding_view():
             name = st.text_input("Kahraman Adı", placeholder="Yeni İsim")
             email = st.text_input("E-Posta Adresi", placeholder="ornek@email.com")
             password = st.text_input("Şifre Belirle", type="password", placeholder="****")
+            group_code = st.text_input("Grup Kodu (Opsiyonel)", placeholder="Eğitmeninden al")
             
             # Cinsiyet Seçimi (Sınıf gizlendi)
             gender = st.radio("Cinsiyet", ["Erkek", "Kadın"], horizontal=True)
@@ -287,9 +533,11 @@ def onboarding_view():
             submitted = st.form_submit_button("Başla", use_container_width=True)
             if submitted:
                 if name and password:
-                    chars = GameSystem.load_characters()
-                    if name in chars:
+                    group_id = group_code.strip() or DEFAULT_GROUP
+                    if GameSystem.load_character(name):
                         st.warning("Bu isim zaten alındı!")
+                    elif group_id != DEFAULT_GROUP and not GameSystem.load_group(group_id):
+                        st.error("Grup kodu bulunamadı!")
                     else:
                         # Varsayılan Sınıf: Savaşçı (Sistemin çalışması için gerekli)
                         char_class = "Savaşçı" 
@@ -300,7 +548,7 @@ def onboarding_view():
                         # Avatar ID: warrior_male veya warrior_female
                         final_avatar_id = f"warrior_{slug_gender}"
                         
-                        create_user(name, char_class, password, email, final_avatar_id)
+                        create_user(name, char_class, password, email, final_avatar_id, group_id)
                         st.rerun()
                 else:
                     st.error("Lütfen tüm alanları doldurun.")
@@ -308,61 +556,26 @@ def onboarding_view():
     # Admin Login at the very bottom
     st.write("")
     with st.expander("👨‍🏫 Eğitmen Girişi"):
+        admin_group = st.text_input("Grup Kodu", value=DEFAULT_GROUP)
         admin_pass = st.text_input("Yönetici Şifresi", type="password")
         if st.button("Yönetici Giriş"):
-            if admin_pass == "admin123":
+            admin_group = admin_group.strip() or DEFAULT_GROUP
+            if GameSystem.authenticate_trainer(admin_group, admin_pass):
                 st.session_state.current_user = "ADMIN"
+                st.session_state.admin_group = admin_group
                 st.rerun()
             else:
                 st.error("Hatalı Şifre")
 
 
-def dashboard_view():
-    char = st.session_state.current_user
-    
-    # Global Dashboard CSS for compact mobile spacing
-    st.markdown("""
-        <style>
-            /* Headers reset */
-            h1, h2, h3, h4, h5, p { margin: 0px !important; padding: 0px !important; }
-            /* Force horizontal layout on mobile for specific containers */
-            [data-testid="stHorizontalBlock"] {
-                flex-wrap: nowrap !important;
-                overflow-x: auto !important;
-                align-items: center !important;
-            }
-            /* Hide scrollbars */
-            ::-webkit-scrollbar { width: 0px; height: 0px; }
-            
-            /* Compact Columns */
-            div[data-testid="column"] { min-width: 0px !important; flex: 1 1 0px !important; }
-            
-            /* Logout Button Style (High Contrast / Universal) */
-            .logout-btn {
-                background-color: #ffffff;
-                color: #31333F !important; /* Dark text for visibility on white */
-                text-decoration: none;
-                font-size: 13px;
-                padding: 3px 10px;
-                border-radius: 4px;
-                border: 1px solid #d6d6d8;
-                display: inline-block;
-                line-height: 1.4;
-                transition: all 0.2s;
-                font-weight: 500;
-                box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-            }
-            .logout-btn:hover {
-                border-color: #ff4b4b;
-                color: #ff4b4b !important;
-                background-color: #f0f2f6;
-            }
-        </style>
-        <div style='zoom: 0.60;'> <!-- Global Zoom -->
-    """, unsafe_allow_html=True)
-    
-    # --- Flex Header Row ---
-    
+def get_img_base64(path):
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode()
+    return "" # Fallback logic needed if wanted
+
+def render_header(char, slot):
+    """Avatar, seviye, XP çubuğu ve statlar. Gönderim sonrası sadece bu alan yeniden çizilir."""
     # Hesaplamalar
     xp_next = char.level * 1000
     xp_pct = min(100, int((char.xp / xp_next) * 100))
@@ -372,18 +585,12 @@ def dashboard_view():
     avatar_path = char.get_avatar_image()
     
     # HTML Header with embedded image
-    import base64
-    def get_img_base64(path):
-        if os.path.exists(path):
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-        return "" # Fallback logic needed if wanted
-
     img_b64 = get_img_base64(avatar_path)
+    logout_href = f"?logout=true&{SESSION_TOKEN_PARAM}={st.session_state.get('session_token', '')}"
     # If image not found locally, use a generic placeholder or the old dicebear logic if desired.
     img_src = f"data:image/png;base64,{img_b64}" if img_b64 else "https://api.dicebear.com/7.x/adventurer/svg?seed=" + char.name
 
-    st.markdown(f"""
+    slot.markdown(f"""
 <div style="display: flex; align-items: center; justify-content: space-between; background: #fff; padding: 12px 16px; border-radius: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.05); margin-bottom: 20px; flex-wrap: wrap; gap: 15px; border: 1px solid #f0f0f0;">
 <!-- SOL: İsim ve Bilgi -->
 <div style="display: flex; align-items: center; gap: 15px;">
@@ -398,7 +605,7 @@ def dashboard_view():
 </div>
 <!-- SAĞ: Çıkış Butonu -->
 <div>
-<a href="?logout=true" target="_self" class="logout-btn" style="padding: 8px 18px; font-size: 14px; border: 1px solid #fee2e2; color: #dc2626 !important; background: linear-gradient(to bottom, #fff, #fef2f2); border-radius: 8px; font-weight: 600; box-shadow: 0 1px 2px rgba(0,0,0,0.05); white-space: nowrap;">Çıkış</a>
+<a href="{logout_href}" target="_self" class="logout-btn" style="padding: 8px 18px; font-size: 14px; border: 1px solid #fee2e2; color: #dc2626 !important; background: linear-gradient(to bottom, #fff, #fef2f2); border-radius: 8px; font-weight: 600; box-shadow: 0 1px 2px rgba(0,0,0,0.05); white-space: nowrap;">Çıkış</a>
 </div>
 </div>
 <!-- XP Bar (Kırmızı - İstenilen Stil) -->
@@ -420,320 +627,503 @@ def dashboard_view():
 </div>
 """, unsafe_allow_html=True)
 
-    # Hidden logical logout check
-    query_params = st.query_params
-    if "logout" in query_params:
-        st.session_state.current_user = None
-        st.query_params.clear()
-        st.rerun()
+def render_history(char, slot):
+    """Maceran Günlüğü: tarihe göre en yeni 5 aktivite (içe aktarılan eski kayıtlar geçmişin sonunda olabilir)."""
+    with slot.container():
+        if char.history:
+            for h in char.recent_history(5):
+                status_icon = "✅"
+                if h.get("status") == "pending":
+                    status_icon = "⏳"
+                elif h.get("status") == "rejected":
+                    status_icon = "❌"
+                
+                xp_text = f"+{h.get('xp_reward', h.get('xp_gained', 0))} XP"
+                st.text(f"{status_icon} {h['date'][:16]} - {h['description']} ({xp_text})")
+        else:
+            st.caption("Henüz bir kayıt yok.")
 
-    st.markdown("</div>", unsafe_allow_html=True) # Close zoom div
-    
-    # --- Task Board ---
+@st.fragment
+def older_history(char):
+    """Oturumda tutulmayan eski aktiviteler; istek üzerine sayfa sayfa getirilir."""
+    page = st.session_state.get("history_page", 0)
+    total_pages = (char.history_offset + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+
+    if st.button("Yükle", key="history_load") or "history_entries" in st.session_state:
+        # Sadece o anki sayfa tutulur; tüm geçmiş oturuma alınmaz
+        if st.session_state.get("history_loaded_page") != page:
+            st.session_state.history_entries = GameSystem.load_history_page(char.name, char.history_offset, page)
+            st.session_state.history_loaded_page = page
+        for h in st.session_state.history_entries:
+            st.text(f"{h['date'][:16]} - {h['description']} (+{h.get('xp_reward', h.get('xp_gained', 0))} XP)")
+
+        c_prev, c_info, c_next = st.columns(3)
+        if c_prev.button("← Yeni", key="history_prev", disabled=page == 0):
+            st.session_state.history_page = page - 1
+            st.rerun(scope="fragment")
+        c_info.caption(f"Sayfa {page + 1} / {total_pages}")
+        if c_next.button("Eski →", key="history_next", disabled=page + 1 >= total_pages):
+            st.session_state.history_page = page + 1
+            st.rerun(scope="fragment")
+
+def refresh_after_submit(char, slots, delay):
+    """
+    Gönderim sonrası tüm sayfa yerine sadece başlık, günlük ve gönderimin yapıldığı sekme yenilenir.
+    Başlık ve günlük, sekme fragment'ının dışındaki st.empty() alanlarına yazılır.
+    """
+    render_header(char, slots["header"])
+    render_history(char, slots["history"])
+    time.sleep(delay)
+    st.rerun(scope="fragment")
+
+@st.fragment
+def daily_tab(char, slots):
+    """Günlük sekmesi: su ve adım görevleri."""
+    st.subheader("Günlük Görevler")
     
-    st.markdown("<div style='zoom: 0.9;'>", unsafe_allow_html=True)
-    # Tabs...
+    # Vertical Layout: Water First
+    with st.container(border=True):
+        st.markdown("##### 💧 Su Tüketimi")
+        st.caption("Su hayattır! Hedefini seç.")
         
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Günlük", "Antrenman", "Beslenme", "Boss Savaşı", "✨ Extra"])
-    
-    with tab1:
-        st.subheader("Günlük Görevler")
+        water_tiers = {
+            "250ml - Başlangıç Yudumu": {"xp": 5, "vit": 1},
+            "500ml - Sabah İksiri": {"xp": 10, "vit": 2},
+            "750ml - Doğa Pınarı": {"xp": 15, "vit": 3},
+            "1 LT - Su Matarası": {"xp": 25, "vit": 5},
+            "2 LT - Nehir Ruhu": {"xp": 50, "vit": 10},
+            "3 LT - Okyanus Efendisi": {"xp": 100, "vit": 20},
+        }
         
-        # Vertical Layout: Water First
-        with st.container(border=True):
-            st.markdown("##### 💧 Su Tüketimi")
-            st.caption("Su hayattır! Hedefini seç.")
-            
-            water_tiers = {
-                "250ml - Başlangıç Yudumu": {"xp": 5, "vit": 1},
-                "500ml - Sabah İksiri": {"xp": 10, "vit": 2},
-                "750ml - Doğa Pınarı": {"xp": 15, "vit": 3},
-                "1 LT - Su Matarası": {"xp": 25, "vit": 5},
-                "2 LT - Nehir Ruhu": {"xp": 50, "vit": 10},
-                "3 LT - Okyanus Efendisi": {"xp": 100, "vit": 20},
-            }
-            
-            w_selection = st.selectbox("Miktar Seç", list(water_tiers.keys()))
-            w_data = water_tiers[w_selection]
-            st.info(f"🎁 **Ödül:** {w_data['xp']} XP, +{w_data['vit']} VIT")
-            
-            with st.form("water_form"):
-                if st.form_submit_button("İçtim!"):
-                    with st.spinner(get_rpg_loading_msg()):
-                        desc_text = f"Su Tüketimi: {w_selection}"
-                        char.log_activity("Hydration", desc_text, w_data['xp'], {"VIT": w_data['vit']})
-                        save_current_user()
-                        st.toast(f"Yarasın! {w_selection} içildi. 💧", icon="✅")
-                        st.success(f"Yarasın! +{w_data['xp']} XP, +{w_data['vit']} VIT")
-                        time.sleep(1)
-                        st.rerun()
-
-        # Vertical Layout: Steps Second
-        with st.container(border=True):
-            st.markdown("##### 🚶 Adım Görevleri")
-            st.caption("Yürümek keşfetmektir!")
-            
-            walk_tiers = {
-                "7k Adım - Devriye Gezintisi": {"xp": 30, "agi": 5},
-                "10k Adım - Hazine Avı": {"xp": 50, "agi": 10},
-                "15k Adım - Efsanevi Yolculuk": {"xp": 100, "agi": 15},
-            }
-            
-            walk_selection = st.selectbox("Hedef Seç", list(walk_tiers.keys()))
-            walk_data = walk_tiers[walk_selection]
-            st.info(f"🎁 **Ödül:** {walk_data['xp']} XP, +{walk_data['agi']} AGI")
-            st.caption("💡 **İpucu:** Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.")
-            
-            with st.form("walk_form"):
-                walk_proof = st.file_uploader("Adım Sayar (Opsiyonel - Extra Puan İçin)", type=["jpg", "png"], key="walk_proof")
-                
-                if st.form_submit_button("Tamamladım"):
-                    with st.spinner(get_rpg_loading_msg()):
-                        image_path = None
-                        if walk_proof:
-                            if not os.path.exists("uploads"):
-                                os.makedirs("uploads")
-                            image_path = os.path.join("uploads", walk_proof.name)
-                            with open(image_path, "wb") as f:
-                                f.write(walk_proof.getbuffer())
-                        
-                        desc_text = f"Yürüyüş: {walk_selection}"
-                        
-                        char.log_activity("Cardio", desc_text, walk_data['xp'], {"AGI": walk_data['agi']}, proof_image=image_path)
-                        save_current_user()
-                        
-                        if image_path:
-                            st.toast("Kanıtlı yürüyüş gönderildi! Hoca puanlayacak. 👣", icon="⏳")
-                            st.info("Onaya gönderildi! Ekstra puan beklenebilir. ⏳")
-                        else:
-                             st.toast("Yürüyüş kaydedildi! 👣", icon="✅")
-                             st.success(f"Tebrikler! +{walk_data['xp']} XP kazandın.")
-                             
-                        time.sleep(1)
-                        st.rerun()
-
-    with tab5:
-        st.subheader("✨ Extra Aktivite")
-        st.info("Oyun dışı bir gelişim mi gösterdin? (Örn: Sigarayı bıraktın, terapiye gittin, farklı bir spor denedin).")
-        st.caption("📝 Buraya yaz, istersen kanıt ekle. **Eğitmenin değerlendirip sana özel Stat ve XP versin.**")
+        w_selection = st.selectbox("Miktar Seç", list(water_tiers.keys()))
+        w_data = water_tiers[w_selection]
+        st.info(f"🎁 **Ödül:** {w_data['xp']} XP, +{w_data['vit']} VIT")
         
-        with st.form("extra_form"):
-            extra_desc = st.text_area("Ne yaptın?", "Örn: 30 gün boyunca her sabah 5'te kalktım ve...")
-            extra_proof = st.file_uploader("Kanıt Fotoğrafı/Videosu (Opsiyonel)", type=["png", "jpg", "jpeg", "mp4"])
-            
-            submitted = st.form_submit_button("Eğitmene Gönder")
-            if submitted:
-                if extra_desc:
-                    with st.spinner(get_rpg_loading_msg()):
-                        image_path = None
-                        if extra_proof:
-                            if not os.path.exists("uploads"):
-                                os.makedirs("uploads")
-                            image_path = os.path.join("uploads", extra_proof.name)
-                            with open(image_path, "wb") as f:
-                                f.write(extra_proof.getbuffer())
-                            
-                        char.log_activity("Extra", extra_desc, 0, {}, proof_image=image_path)
-                        save_current_user()
-                        
-                        if image_path:
-                            st.toast("Efsanevi hareket kanıtla gönderildi! ✨", icon="🌟")
-                            st.success("Harika! Kanıtlı aktivite gönderildi. Eğitmen değerlendirip puan verecek! 🌟")
-                        else:
-                            st.toast("Extra aktivite beyanı alındı! ✨", icon="📝")
-                            st.success("Aktivite eğitmenin onayına gönderildi! Değerlendirme bekleniyor.")
-
-                        time.sleep(1.5)
-                        st.rerun()
-                else:
-                    st.error("Lütfen en azından bir açıklama yaz.")
+        with st.form("water_form"):
+            water_submit = st.form_submit_button("İçtim!")
+            water_key = get_form_key("water_form", water_submit)
+            if water_submit:
+                with st.spinner(get_rpg_loading_msg()):
+                    desc_text = f"Su Tüketimi: {w_selection}"
+                    if char.log_activity("Hydration", desc_text, w_data['xp'], {"VIT": w_data['vit']}, idempotency_key=water_key):
+                        save_current_user(water_key)
+                    st.toast(f"Yarasın! {w_selection} içildi. 💧", icon="✅")
+                    st.success(f"Yarasın! +{w_data['xp']} XP, +{w_data['vit']} VIT")
+                    refresh_after_submit(char, slots, 1)
 
-    with tab2:
-        st.subheader("Antrenman Kaydı")
-        st.info("Yaptığın antrenmanı gir ve güçlen!")
-        st.caption("💡 **İpucu:** Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.")
+    # Vertical Layout: Steps Second
+    with st.container(border=True):
+        st.markdown("##### 🚶 Adım Görevleri")
+        st.caption("Yürümek keşfetmektir!")
         
+        walk_selection = st.selectbox("Hedef Seç", list(WALK_TIERS.keys()))
+        walk_data = WALK_TIERS[walk_selection]
+        st.info(f"🎁 **Ödül:** {walk_data['xp']} XP, +{walk_data['agi']} AGI")
+        st.caption("💡 **İpucu:** Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.")
         
-
-        with st.form("workout_form"):
-            # Dinamik antrenman tipleri
-            w_type = st.selectbox("Tip", list(WORKOUT_MULTIPLIERS.keys()))
-            duration = st.number_input("Süre (Dakika)", min_value=10, value=45, step=5)
-            desc = st.text_input("Açıklama", "Örn: Bacak günü, 5km koşu...")
-            proof_file = st.file_uploader("Kanıt Fotoğrafı Yükle (Opsiyonel)", type=["png", "jpg", "jpeg"])
+        with st.form("walk_form"):
+            walk_proof = st.file_uploader("Adım Sayar (Opsiyonel - Extra Puan İçin)", type=["jpg", "png"], key="walk_proof")
             
-            # Canlı Hesaplama Gösterimi (Form içinde state yenilenmediği için submit sonrası veya dışarıda göstermek lazım ama form içinde static kalır. 
-            # Kullanıcıya bilgi vermek için st.info statik kalabilir veya form dışına alabiliriz. 
-            # Form kısıtlaması nedeniyle şimdilik form içine bilgi notu ekleyelim ama dinamik olmayabilir.)
-            # Streamlit formlarında submit olmadan değer değişince rerun olmaz. O yüzden tahmini değerleri sabit gösteriyoruz.
-            
-            submitted = st.form_submit_button("Kaydet")
-            if submitted:
+            walk_submit = st.form_submit_button("Tamamladım")
+            walk_key = get_form_key("walk_form", walk_submit)
+            if walk_submit:
                 with st.spinner(get_rpg_loading_msg()):
-                    # Merkezi hesaplama
-                    xp_reward, stat_reward = Character.calculate_workout_rewards(w_type, duration)
-                    
-                    # Save Image
                     image_path = None
-                    if proof_file:
-                        if not os.path.exists("uploads"):
-                            os.makedirs("uploads")
-                        image_path = os.path.join("uploads", proof_file.name)
-                        with open(image_path, "wb") as f:
-                            f.write(proof_file.getbuffer())
-
-                    # Activity Log
-                    act_type = w_type.split(" ")[0] # "Ağırlık", "Kardiyo" vs.
-                    char.log_activity(act_type, f"{desc} ({duration} dk)", xp_reward, stat_reward, proof_image=image_path)
-                    save_current_user()
+                    if walk_proof:
+                        image_path = save_upload(walk_proof, char.name, walk_key)
+                    
+                    desc_text = f"Yürüyüş: {walk_selection}"
+                    
+                    if char.log_activity("Cardio", desc_text, walk_data['xp'], {"AGI": walk_data['agi']}, proof_image=image_path, idempotency_key=walk_key):
+                        save_current_user(walk_key)
                     
-                    if proof_file:
-                        st.toast("Antrenman onaya gönderildi! Hocan puanlayacak. 💪", icon="⏳")
-                        st.info("Aktivite onaya gönderildi! Ekstra puan şansı. ⏳")
+                    if image_path:
+                        st.toast("Kanıtlı yürüyüş gönderildi! Hoca puanlayacak. 👣", icon="⏳")
+                        st.info("Onaya gönderildi! Ekstra puan beklenebilir. ⏳")
                     else:
-                        st.toast(f"Antrenman kaydedildi! +{xp_reward} XP 🔥", icon="✅")
-                        st.success(f"Harika iş! +{xp_reward} XP ve statlarını geliştirdin.")
-                        
-                    time.sleep(1.5)
-                    st.rerun()
+                         st.toast("Yürüyüş kaydedildi! 👣", icon="✅")
+                         st.success(f"Tebrikler! +{walk_data['xp']} XP kazandın.")
+                         
+                    refresh_after_submit(char, slots, 1)
 
-    with tab3:
-        st.subheader("🍎 Sağlıklı Beslenme")
-        st.info("Sağlıklı bir öğün tüket, **+150 XP** ve **+5 VIT** kazan!")
-        st.caption("💡 **İpucu:** Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.")
+@st.fragment
+def extra_tab(char, slots):
+    """Extra sekmesi: eğitmen değerlendirmeli serbest aktivite."""
+    st.subheader("✨ Extra Aktivite")
+    st.info("Oyun dışı bir gelişim mi gösterdin? (Örn: Sigarayı bıraktın, terapiye gittin, farklı bir spor denedin).")
+    st.caption("📝 Buraya yaz, istersen kanıt ekle. **Eğitmenin değerlendirip sana özel Stat ve XP versin.**")
+    
+    with st.form("extra_form"):
+        extra_desc = st.text_area("Ne yaptın?", "Örn: 30 gün boyunca her sabah 5'te kalktım ve...")
+        extra_proof = st.file_uploader("Kanıt Fotoğrafı/Videosu (Opsiyonel)", type=["png", "jpg", "jpeg", "mp4"])
         
-        with st.form("nutrition_form"):
-            meal_type = st.selectbox("Öğün", ["Kahvaltı", "Öğle Yemeği", "Akşam Yemeği", "Ara Öğün"])
-            meal_desc = st.text_input("Menü", "Örn: Izgara Tavuk ve Salata")
-            meal_proof = st.file_uploader("Öğün Fotoğrafı (Opsiyonel)", type=["png", "jpg", "jpeg"])
-            
-            meal_submit = st.form_submit_button("Afiyet Olsun")
-            
-            if meal_submit:
+        submitted = st.form_submit_button("Eğitmene Gönder")
+        extra_key = get_form_key("extra_form", submitted)
+        if submitted:
+            if extra_desc:
                 with st.spinner(get_rpg_loading_msg()):
                     image_path = None
-                    if meal_proof:
-                        if not os.path.exists("uploads"):
-                            os.makedirs("uploads")
-                        image_path = os.path.join("uploads", meal_proof.name)
-                        with open(image_path, "wb") as f:
-                            f.write(meal_proof.getbuffer())
-
-                    # Ödül: 150 XP, +5 VIT (Base)
-                    char.log_activity("Nutrition", f"{meal_type}: {meal_desc}", 150, {"VIT": 5}, proof_image=image_path)
-                    save_current_user()
+                    if extra_proof:
+                        image_path = save_upload(extra_proof, char.name, extra_key)
+                        
+                    if char.log_activity("Extra", extra_desc, 0, {}, proof_image=image_path, idempotency_key=extra_key):
+                        save_current_user(extra_key)
                     
                     if image_path:
-                        st.toast("Afiyet olsun! Fotoğraflı öğün onaya gitti. 🥗", icon="⏳")
-                        st.info("Fotoğraf yüklendi. Hoca ekstra puan verebilir! ⏳")
+                        st.toast("Efsanevi hareket kanıtla gönderildi! ✨", icon="🌟")
+                        st.success("Harika! Kanıtlı aktivite gönderildi. Eğitmen değerlendirip puan verecek! 🌟")
                     else:
-                        st.toast("Afiyet olsun! Öğün kaydedildi. 🥗", icon="🍽️")
-                        st.success("Öğün işlendi! +5 VIT, +150 XP")
+                        st.toast("Extra aktivite beyanı alındı! ✨", icon="📝")
+                        st.success("Aktivite eğitmenin onayına gönderildi! Değerlendirme bekleniyor.")
 
-                    time.sleep(1)
-                    st.rerun()
+                    refresh_after_submit(char, slots, 1.5)
+            else:
+                st.error("Lütfen en azından bir açıklama yaz.")
 
-    with tab4:
-        st.subheader("👹 Boss Savaşı: Titanların Yükselişi")
-        st.info("Kilona göre kaderini seç! Haftalık en büyük meydan okuma.")
-        
-        # Kilo Girişi
-        user_weight = st.number_input("Vücut Ağırlığı (kg)", min_value=40, value=70, step=1)
-        
-        t1_target = int(user_weight * 0.5)
-        t2_target = int(user_weight * 1.0)
-        t3_target = int(user_weight * 1.5)
-        
-        boss_options = {
-            "Seviye 1: Demir Çırak (0.5x)": {
-                "desc": f"{t1_target}kg ile Bench/Squat/Deadlift/LatPull",
-                "xp": 500, 
-                "stats": {"STR": 5, "VIT": 5},
-                "target_kg": t1_target
-            },
-            "Seviye 2: Çelik Muhafız (1.0x)": {
-                "desc": f"{user_weight}kg ile Bench/Squat/Deadlift/LatPull",
-                "xp": 1500, 
-                "stats": {"STR": 15, "VIT": 10},
-                "target_kg": user_weight
-            },
-            "Seviye 3: Titanyum Titan (1.5x)": {
-                "desc": f"{t3_target}kg ile Bench/Squat/Deadlift/LatPull",
-                "xp": 3000, 
-                "stats": {"STR": 30, "VIT": 20},
-                "target_kg": t3_target
-            }
-        }
-        
-        selected_boss = st.radio("Zorluk Seç", list(boss_options.keys()))
-        boss_data = boss_options[selected_boss]
+@st.fragment
+def workout_tab(char, slots):
+    """Antrenman sekmesi."""
+    st.subheader("Antrenman Kaydı")
+    st.info("Yaptığın antrenmanı gir ve güçlen!")
+    st.caption("💡 **İpucu:** Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.")
+    
+    
+
+    with st.form("workout_form"):
+        # Dinamik antrenman tipleri
+        w_type = st.selectbox("Tip", list(WORKOUT_MULTIPLIERS.keys()))
+        duration = st.number_input("Süre (Dakika)", min_value=10, value=45, step=5)
+        desc = st.text_input("Açıklama", "Örn: Bacak günü, 5km koşu...")
+        proof_file = st.file_uploader("Kanıt Fotoğrafı Yükle (Opsiyonel)", type=["png", "jpg", "jpeg"])
         
-        st.markdown(f"""
-        ### 📜 {selected_boss.split(':')[1]}
+        # Canlı Hesaplama Gösterimi (Form içinde state yenilenmediği için submit sonrası veya dışarıda göstermek lazım ama form içinde static kalır. 
+        # Kullanıcıya bilgi vermek için st.info statik kalabilir veya form dışına alabiliriz. 
+        # Form kısıtlaması nedeniyle şimdilik form içine bilgi notu ekleyelim ama dinamik olmayabilir.)
+        # Streamlit formlarında submit olmadan değer değişince rerun olmaz. O yüzden tahmini değerleri sabit gösteriyoruz.
         
-        <div style="background-color: #fef3c7; border-left: 5px solid #d97706; padding: 15px; border-radius: 5px; margin-bottom: 15px;">
-            <p style="color: #92400e; font-weight: bold; margin: 0; font-size: 14px; text-transform: uppercase;">⚔️ Görev</p>
-            <p style="color: #78350f; font-size: 18px; font-weight: 500; margin: 5px 0 0 0;">{boss_data['desc']}</p>
-        </div>
+        submitted = st.form_submit_button("Kaydet")
+        workout_key = get_form_key("workout_form", submitted)
+        if submitted:
+            with st.spinner(get_rpg_loading_msg()):
+                # Merkezi hesaplama
+                xp_reward, stat_reward = Character.calculate_workout_rewards(w_type, duration)
+                
+                # Save Image
+                image_path = None
+                if proof_file:
+                    image_path = save_upload(proof_file, char.name, workout_key)
+
+                # Activity Log
+                act_type = w_type.split(" ")[0] # "Ağırlık", "Kardiyo" vs.
+                if char.log_activity(act_type, f"{desc} ({duration} dk)", xp_reward, stat_reward, proof_image=image_path, idempotency_key=workout_key):
+                    save_current_user(workout_key)
+                
+                if proof_file:
+                    st.toast("Antrenman onaya gönderildi! Hocan puanlayacak. 💪", icon="⏳")
+                    st.info("Aktivite onaya gönderildi! Ekstra puan şansı. ⏳")
+                else:
+                    st.toast(f"Antrenman kaydedildi! +{xp_reward} XP 🔥", icon="✅")
+                    st.success(f"Harika iş! +{xp_reward} XP ve statlarını geliştirdin.")
+                    
+                refresh_after_submit(char, slots, 1.5)
+
+    with st.expander("📥 Toplu İçe Aktar (Adım Sayar / Fitness Uygulaması)"):
+        st.caption("CSV (tarih + adım veya süre kolonları) ya da GPX dosyası yükle. Daha önce aktarılanlar tekrar sayılmaz.")
+        import_file = st.file_uploader("Dışa aktarım dosyası", type=["csv", "gpx"], key="import_file")
+        if st.button("İçe Aktar", disabled=import_file is None):
+            from importer import import_activities
+
+            with st.spinner(get_rpg_loading_msg()):
+                # Tekrar kontrolü eksiksiz geçmiş ister; oturumda sadece son aktiviteler var
+                full_char = GameSystem.load_character(char.name)
+                if not full_char:
+                    st.error("Karakter kaydı şu an yüklenemiyor, lütfen sonra tekrar dene.")
+                    return
+                try:
+                    result = import_activities(full_char, import_file, import_file.name)
+                except ValueError as e:
+                    st.error(f"Dosya okunamadı: {e}")
+                    return
+            if result["imported"]:
+                st.session_state.current_user = Character.session_view(full_char.to_dict())
+                st.toast(f"{result['imported']} aktivite aktarıldı! +{result['xp']} XP", icon="✅")
+                time.sleep(1.5)
+                # Oturumdaki karakter değişti: tüm sayfa yenilenir
+                st.rerun()
+            st.info(f"Yeni aktivite bulunamadı ({result['skipped']} kayıt atlandı).")
+
+@st.fragment
+def nutrition_tab(char, slots):
+    """Beslenme sekmesi."""
+    st.subheader("🍎 Sağlıklı Beslenme")
+    st.info("Sağlıklı bir öğün tüket, **+150 XP** ve **+5 VIT** kazan!")
+    st.caption("💡 **İpucu:** Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.")
+    
+    with st.form("nutrition_form"):
+        meal_type = st.selectbox("Öğün", ["Kahvaltı", "Öğle Yemeği", "Akşam Yemeği", "Ara Öğün"])
+        meal_desc = st.text_input("Menü", "Örn: Izgara Tavuk ve Salata")
+        meal_proof = st.file_uploader("Öğün Fotoğrafı (Opsiyonel)", type=["png", "jpg", "jpeg"])
         
-        **Ödüller:**
-        - 🌟 **{boss_data['xp']} XP**
-        - 💪 **+{boss_data['stats']['STR']} STR**
-        - ❤️ **+{boss_data['stats']['VIT']} VIT**
+        meal_submit = st.form_submit_button("Afiyet Olsun")
+        meal_key = get_form_key("nutrition_form", meal_submit)
         
-        💡 **İpucu:** Video/Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.
-        """, unsafe_allow_html=True)
+        if meal_submit:
+            with st.spinner(get_rpg_loading_msg()):
+                image_path = None
+                if meal_proof:
+                    image_path = save_upload(meal_proof, char.name, meal_key)
+
+                # Ödül: 150 XP, +5 VIT (Base)
+                if char.log_activity("Nutrition", f"{meal_type}: {meal_desc}", 150, {"VIT": 5}, proof_image=image_path, idempotency_key=meal_key):
+                    save_current_user(meal_key)
+                
+                if image_path:
+                    st.toast("Afiyet olsun! Fotoğraflı öğün onaya gitti. 🥗", icon="⏳")
+                    st.info("Fotoğraf yüklendi. Hoca ekstra puan verebilir! ⏳")
+                else:
+                    st.toast("Afiyet olsun! Öğün kaydedildi. 🥗", icon="🍽️")
+                    st.success("Öğün işlendi! +5 VIT, +150 XP")
+
+                refresh_after_submit(char, slots, 1)
+
+@st.fragment
+def boss_tab(char, slots):
+    """Boss Savaşı sekmesi."""
+    st.subheader("👹 Boss Savaşı: Titanların Yükselişi")
+    st.info("Kilona göre kaderini seç! Haftalık en büyük meydan okuma.")
+    
+    # Kilo Girişi
+    user_weight = st.number_input("Vücut Ağırlığı (kg)", min_value=40, value=70, step=1)
+    
+    t1_target = int(user_weight * 0.5)
+    t2_target = int(user_weight * 1.0)
+    t3_target = int(user_weight * 1.5)
+    
+    boss_options = {
+        "Seviye 1: Demir Çırak (0.5x)": {
+            "desc": f"{t1_target}kg ile Bench/Squat/Deadlift/LatPull",
+            "xp": 500, 
+            "stats": {"STR": 5, "VIT": 5},
+            "target_kg": t1_target
+        },
+        "Seviye 2: Çelik Muhafız (1.0x)": {
+            "desc": f"{user_weight}kg ile Bench/Squat/Deadlift/LatPull",
+            "xp": 1500, 
+            "stats": {"STR": 15, "VIT": 10},
+            "target_kg": user_weight
+        },
+        "Seviye 3: Titanyum Titan (1.5x)": {
+            "desc": f"{t3_target}kg ile Bench/Squat/Deadlift/LatPull",
+            "xp": 3000, 
+            "stats": {"STR": 30, "VIT": 20},
+            "target_kg": t3_target
+        }
+    }
+    
+    selected_boss = st.radio("Zorluk Seç", list(boss_options.keys()))
+    boss_data = boss_options[selected_boss]
+    
+    st.markdown(f"""
+    ### 📜 {selected_boss.split(':')[1]}
+    
+    <div style="background-color: #fef3c7; border-left: 5px solid #d97706; padding: 15px; border-radius: 5px; margin-bottom: 15px;">
+        <p style="color: #92400e; font-weight: bold; margin: 0; font-size: 14px; text-transform: uppercase;">⚔️ Görev</p>
+        <p style="color: #78350f; font-size: 18px; font-weight: 500; margin: 5px 0 0 0;">{boss_data['desc']}</p>
+    </div>
+    
+    **Ödüller:**
+    - 🌟 **{boss_data['xp']} XP**
+    - 💪 **+{boss_data['stats']['STR']} STR**
+    - ❤️ **+{boss_data['stats']['VIT']} VIT**
+    
+    💡 **İpucu:** Video/Fotoğraf yüklersen eğitmeninden **EKSTRA** XP ve Stat ödülleri kazanabilirsin! Yoksa standart ödülü alırsın.
+    """, unsafe_allow_html=True)
+    
+    with st.form("boss_form"):
+        boss_desc = st.text_input("Zafer Notu", f"{boss_data['target_kg']}kg başardım!")
+        boss_proof = st.file_uploader("Kanıt (Video/Fotoğraf) - Opsiyonel", type=["png", "jpg", "jpeg", "mp4"])
+        boss_submit = st.form_submit_button("⚔️ Saldırıya Başla")
+        boss_key = get_form_key("boss_form", boss_submit)
         
-        with st.form("boss_form"):
-            boss_desc = st.text_input("Zafer Notu", f"{boss_data['target_kg']}kg başardım!")
-            boss_proof = st.file_uploader("Kanıt (Video/Fotoğraf) - Opsiyonel", type=["png", "jpg", "jpeg", "mp4"])
-            boss_submit = st.form_submit_button("⚔️ Saldırıya Başla")
+        if boss_submit:
+            with st.spinner(get_rpg_loading_msg()):
+                image_path = None
+                if boss_proof:
+                    image_path = save_upload(boss_proof, char.name, boss_key)
+
+                # Activity Log
+                activity_text = f"Boss Savaşı: {selected_boss} - {boss_desc}"
+                if char.log_activity("BossFight", activity_text, boss_data['xp'], boss_data['stats'], proof_image=image_path, idempotency_key=boss_key):
+                    save_current_user(boss_key)
+                
+                if image_path:
+                    st.toast("Kaderin mühürlendi! Kanıtlı zafer yollandı. 👹", icon="⚔️")
+                    st.success(f"Saldırı başarılı! Kanıt gönderildi. ({boss_data['xp']} XP)")
+                else:
+                    st.toast("Zafer beyanı alındı! 👹", icon="⚔️")
+                    st.success(f"Saldırı başarılı! ({boss_data['xp']} XP)")
+
+                refresh_after_submit(char, slots, 1.5)
+
+@st.fragment
+def progress_tab(char):
+    """
+    Gelişim sekmesi: karakterde tutulan seyreltilmiş seriden çizilir, geçmiş taranmaz.
+    Grafikler (pandas/plotly) sadece istenince çizilir; her panel çiziminde import edilmez.
+    """
+    st.subheader("📈 Gelişim")
+    points = char.progress_series()
+    if not points:
+        st.info("Henüz onaylanmış bir aktivite yok. İlk görevini tamamla!")
+        return
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Toplam XP", char.progress["total_xp"])
+    m2.metric("Seviye", char.level)
+    m3.metric("Seviye Atlama", len(char.progress["level_ups"]))
+
+    if st.toggle("📊 Grafikleri Göster", key="progress_charts"):
+        progress_charts(char, points)
+
+    st.markdown("##### 🏆 Başarımlar & Görevler")
+    for rule, record, current, target in ACHIEVEMENT_ENGINE.summary(char.achievements):
+        if record and not rule.repeatable:
+            st.text(f"✅ {rule.title} - {rule.description} ({record['date']})")
+        else:
+            times = f" · {record['times']} kez tamamlandı" if record else ""
+            st.progress(current / target, text=f"{rule.title} - {rule.description}: {current}/{target} (+{rule.reward.get('xp', 0)} XP){times}")
+
+    if char.progress["level_ups"]:
+        with st.expander("⬆️ Seviye Atlamaları"):
+            for date, level in reversed(char.progress["level_ups"]):
+                st.text(f"{date} - Seviye {level}")
+
+def progress_charts(char, points):
+    with startup_timer("import: pandas/plotly"):
+        import pandas as pd
+        import plotly.express as px
+
+    df = pd.DataFrame(points, columns=["Tarih", "Toplam XP", "Seviye", "STR", "AGI", "VIT", "WIS"])
+    df["Tarih"] = pd.to_datetime(df["Tarih"])
+
+    fig_xp = px.line(df, x="Tarih", y="Toplam XP", title="Toplam XP")
+    st.plotly_chart(fig_xp, use_container_width=True)
+
+    fig_stats = px.line(df, x="Tarih", y=["STR", "AGI", "VIT", "WIS"], title="Stat Gelişimi")
+    st.plotly_chart(fig_stats, use_container_width=True)
+
+    types = char.progress["types"]
+    df_types = pd.DataFrame(
+        [{"Tür": t, "Adet": c[0], "XP": c[1]} for t, c in types.items()]
+    ).sort_values("XP", ascending=False)
+    fig_types = px.bar(df_types, x="Tür", y="XP", hover_data=["Adet"], title="Aktivite Türleri")
+    st.plotly_chart(fig_types, use_container_width=True)
+
+def dashboard_view():
+    char = st.session_state.current_user
+    
+    # Global Dashboard CSS for compact mobile spacing
+    st.markdown("""
+        <style>
+            /* Headers reset */
+            h1, h2, h3, h4, h5, p { margin: 0px !important; padding: 0px !important; }
+            /* Force horizontal layout on mobile for specific containers */
+            [data-testid="stHorizontalBlock"] {
+                flex-wrap: nowrap !important;
+                overflow-x: auto !important;
+                align-items: center !important;
+            }
+            /* Hide scrollbars */
+            ::-webkit-scrollbar { width: 0px; height: 0px; }
             
-            if boss_submit:
-                with st.spinner(get_rpg_loading_msg()):
-                    image_path = None
-                    if boss_proof:
-                        if not os.path.exists("uploads"):
-                            os.makedirs("uploads")
-                        image_path = os.path.join("uploads", boss_proof.name)
-                        with open(image_path, "wb") as f:
-                            f.write(boss_proof.getbuffer())
-
-                    # Activity Log
-                    activity_text = f"Boss Savaşı: {selected_boss} - {boss_desc}"
-                    char.log_activity("BossFight", activity_text, boss_data['xp'], boss_data['stats'], proof_image=image_path)
-                    save_current_user()
-                    
-                    if image_path:
-                        st.toast("Kaderin mühürlendi! Kanıtlı zafer yollandı. 👹", icon="⚔️")
-                        st.success(f"Saldırı başarılı! Kanıt gönderildi. ({boss_data['xp']} XP)")
-                    else:
-                        st.toast("Zafer beyanı alındı! 👹", icon="⚔️")
-                        st.success(f"Saldırı başarılı! ({boss_data['xp']} XP)")
+            /* Compact Columns */
+            div[data-testid="column"] { min-width: 0px !important; flex: 1 1 0px !important; }
+            
+            /* Logout Button Style (High Contrast / Universal) */
+            .logout-btn {
+                background-color: #ffffff;
+                color: #31333F !important; /* Dark text for visibility on white */
+                text-decoration: none;
+                font-size: 13px;
+                padding: 3px 10px;
+                border-radius: 4px;
+                border: 1px solid #d6d6d8;
+                display: inline-block;
+                line-height: 1.4;
+                transition: all 0.2s;
+                font-weight: 500;
+                box-shadow: 0 1px 2px rgba(0,0,0,0.05);
+            }
+            .logout-btn:hover {
+                border-color: #ff4b4b;
+                color: #ff4b4b !important;
+                background-color: #f0f2f6;
+            }
+        </style>
+        <div style='zoom: 0.60;'> <!-- Global Zoom -->
+    """, unsafe_allow_html=True)
+    
+    # --- Flex Header Row ---
+    # Başlık ve günlük placeholder'ları; sekme fragment'ları gönderim sonrası bunları günceller
+    slots = {"header": st.empty()}
+    render_header(char, slots["header"])
 
-                    time.sleep(1.5)
-                    st.rerun()
+    st.markdown("</div>", unsafe_allow_html=True) # Close zoom div
+    
+    # --- Task Board ---
+    
+    st.markdown("<div style='zoom: 0.9;'>", unsafe_allow_html=True)
+    # Tabs...
+        
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Günlük", "Antrenman", "Beslenme", "Boss Savaşı", "✨ Extra", "📈 Gelişim"])
+    
+    # Her sekme bağımsız bir fragment: sekme içindeki etkileşimler sadece o sekmeyi yeniden çalıştırır
+    with tab1:
+        daily_tab(char, slots)
+
+    with tab2:
+        workout_tab(char, slots)
+
+    with tab3:
+        nutrition_tab(char, slots)
+
+    with tab4:
+        boss_tab(char, slots)
+
+    with tab5:
+        extra_tab(char, slots)
+
+    with tab6:
+        progress_tab(char)
 
     # History Log
     with st.expander("📝 Maceran Günlüğü (Son 5 Aktivite)"):
-        if char.history:
-            for h in reversed(char.history[-5:]):
-                status_icon = "✅"
-                if h.get("status") == "pending":
-                    status_icon = "⏳"
-                elif h.get("status") == "rejected":
-                    status_icon = "❌"
-                
-                xp_text = f"+{h.get('xp_reward', h.get('xp_gained', 0))} XP"
-                st.text(f"{status_icon} {h['date'][:16]} - {h['description']} ({xp_text})")
-        else:
-            st.caption("Henüz bir kayıt yok.")
+        slots["history"] = st.empty()
+        render_history(char, slots["history"])
+
+    if char.history_offset:
+        with st.expander("📜 Eski Kayıtlar"):
+            older_history(char)
 
 # --- Main App Logic ---
 
+# Çıkış bağlantısı (?logout=true) yeni oturum açar; jeton devam ettirilmeden önce iptal edilir
+if "logout" in st.query_params:
+    end_session()
+    st.rerun()
+
+if st.session_state.current_user is None and SESSION_TOKEN_PARAM in st.query_params:
+    with startup_timer("resume: session token"):
+        resume_session(st.query_params[SESSION_TOKEN_PARAM])
+
 if st.session_state.current_user == "ADMIN":
-    admin_dashboard_view()
+    with startup_timer("render: admin_dashboard_view"):
+        admin_dashboard_view()
 elif st.session_state.current_user:
-    dashboard_view()
+    with startup_timer("render: dashboard_view"):
+        dashboard_view()
 else:
-    onboarding_view()
+    with startup_timer("render: onboarding_view"):
+        onboarding_view()
+
+startup_profile_view()
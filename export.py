@@ -0,0 +1,144 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+from models import GameSystem, WORKOUT_MULTIPLIERS
+
+# Aktivite Geçmişi Dışa Aktarma
+# Karakterler veritabanından sayfa sayfa okunur ve satırlar dosyaya akış halinde yazılır;
+# bellek kullanımı tablo boyutundan bağımsız olarak bir sayfa + bir yazma grubu ile sınırlıdır.
+EXPORT_BATCH_ROWS = 5000  # Parquet row group boyutu
+# Eğitmen panelinden hazırlanan dosyalar Streamlit statik sunumuyla (app/static/...) diskten
+# akış halinde indirilir; belleğe okunmaz. Süresi geçenler bir sonraki dışa aktarmada silinir.
+EXPORT_DIR = os.path.join("static", "exports")
+EXPORT_URL_PREFIX = "app/static/exports/"
+EXPORT_TTL_SECONDS = 3600
+EXPORT_COLUMNS = [
+    "student", "group_id", "activity_id", "date", "type", "description", "status",
+    "xp_reward", "STR", "AGI", "VIT", "WIS", "proof_image",
+]
+ACTIVITY_TYPES = ["Hydration", "Cardio", "Nutrition", "BossFight", "Extra", "Gift", "Achievement"] + [
+    workout.split(" ")[0] for workout in WORKOUT_MULTIPLIERS
+]
+
+
+def iter_activity_rows(group_id=None, date_from=None, date_to=None, types=None):
+    """
+    Her aktivite için bir satır (EXPORT_COLUMNS sırasıyla) üretir.
+    date_from / date_to: datetime.date, dahil. types: aktivite tipleri listesi.
+    """
+    start = date_from.isoformat() if date_from else None
+    end = date_to.isoformat() if date_to else None
+    types = set(types) if types else None
+
+    for page in GameSystem.iter_character_pages(group_id):
+        for row in page:
+            for entry in row["data"].get("history", []):
+                day = entry.get("date", "")[:10]
+                if start and day < start:
+                    continue
+                if end and day > end:
+                    continue
+                if types and entry.get("type") not in types:
+                    continue
+                stats = entry.get("stat_rewards") or {}
+                yield [
+                    row["name"],
+                    row.get("group_id"),
+                    entry.get("id"),
+                    entry.get("date"),
+                    entry.get("type"),
+                    entry.get("description"),
+                    entry.get("status"),
+                    entry.get("xp_reward", entry.get("xp_gained", 0)),
+                    stats.get("STR", 0),
+                    stats.get("AGI", 0),
+                    stats.get("VIT", 0),
+                    stats.get("WIS", 0),
+                    entry.get("proof_image"),
+                ]
+
+
+def write_csv(rows, path):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_parquet(rows, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ("student", pa.string()), ("group_id", pa.string()), ("activity_id", pa.string()),
+        ("date", pa.string()), ("type", pa.string()), ("description", pa.string()),
+        ("status", pa.string()), ("xp_reward", pa.int64()),
+        ("STR", pa.int64()), ("AGI", pa.int64()), ("VIT", pa.int64()), ("WIS", pa.int64()),
+        ("proof_image", pa.string()),
+    ])
+    count = 0
+    batch = []
+    with pq.ParquetWriter(path, schema) as writer:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= EXPORT_BATCH_ROWS:
+                writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_COLUMNS, r)) for r in batch], schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_COLUMNS, r)) for r in batch], schema=schema))
+            count += len(batch)
+    return count
+
+
+def remove_stale_exports(ttl=EXPORT_TTL_SECONDS):
+    """EXPORT_DIR altında ttl saniyeden eski dosyaları siler (oturumu kapanmadan terk edilenler)."""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - ttl
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def export_history(path, fmt="csv", group_id=None, date_from=None, date_to=None, types=None):
+    """Filtrelenmiş geçmişi path'e yazar ve satır sayısını döner."""
+    rows = iter_activity_rows(group_id, date_from, date_to, types)
+    if fmt == "parquet":
+        return write_parquet(rows, path)
+    return write_csv(rows, path)
+
+
+if __name__ == "__main__":
+    from datetime import date
+
+    parser = argparse.ArgumentParser(description="Export all activity history as CSV or Parquet.")
+    parser.add_argument("out", help="output file")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--group", help="only this trainer group")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--type", dest="types", action="append", choices=ACTIVITY_TYPES, help="repeatable")
+    args = parser.parse_args()
+
+    try:
+        written = export_history(args.out, args.format, args.group, args.date_from, args.date_to, args.types)
+    except RuntimeError as e:
+        if os.path.exists(args.out):
+            os.remove(args.out)
+        print(f"Export failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Exported {written} activities to {args.out}", file=sys.stderr)
@@ -0,0 +1,236 @@
+import csv
+import io
+import re
+import sys
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from models import Character, GameSystem, WALK_TIERS
+
+# Toplu İçe Aktarma
+# Adım sayar / fitness uygulaması dışa aktarımlarını (CSV, GPX) akış halinde okur,
+# mevcut ödül kurallarına (adım kademeleri, calculate_workout_rewards) çevirir ve
+# karakter başına tek seviye hesabı + tek kayıt ile uygular.
+
+# Uygulamaların aktivite adları -> WORKOUT_MULTIPLIERS anahtarı
+WORKOUT_KEYWORDS = [
+    ("hiit", "HIIT (AGI)"),
+    ("yoga", "Yoga/Esneme (WIS)"),
+    ("stretch", "Yoga/Esneme (WIS)"),
+    ("esneme", "Yoga/Esneme (WIS)"),
+    ("strength", "Ağırlık (STR)"),
+    ("weight", "Ağırlık (STR)"),
+    ("ağırlık", "Ağırlık (STR)"),
+    ("gym", "Ağırlık (STR)"),
+]
+DEFAULT_WORKOUT = "Kardiyo (AGI)"  # koşu, bisiklet, yürüyüş, yüzme...
+
+DATE_COLUMNS = ("date", "tarih", "day", "start", "start_time", "starttime", "startdate", "timestamp")
+STEP_COLUMNS = ("steps", "step_count", "stepcount", "adım", "adim")
+TYPE_COLUMNS = ("type", "activity", "activity_type", "activitytype", "sport", "tür")
+DURATION_COLUMNS = ("duration", "duration_min", "duration_minutes", "minutes", "süre", "sure")
+DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y", "%d.%m.%Y %H:%M", "%Y-%m-%d %H:%M:%S")
+# "45", "45 min", "1h 30m", "1 saat 20 dk" gibi süreler; birimsiz sayı dakikadır
+DURATION_PART = re.compile(r"(\d+(?:[.,]\d+)?)\s*(hours?|hrs|hr|h|saat|sa|minutes?|mins|min|m|dakika|dk|seconds?|secs|sec|saniye|sn|s)?", re.IGNORECASE)
+DURATION_UNITS = {"h": 60, "hr": 60, "hrs": 60, "hour": 60, "hours": 60, "sa": 60, "saat": 60,
+                  "s": 1 / 60, "sec": 1 / 60, "secs": 1 / 60, "second": 1 / 60, "seconds": 1 / 60, "sn": 1 / 60, "saniye": 1 / 60}
+
+
+def parse_date(value):
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+
+def parse_duration(value):
+    """Süreyi dakikaya çevirir: "HH:MM:SS", "MM:SS", "45", "45 min", "1h 30m". Okunamazsa ValueError."""
+    value = value.strip()
+    if ":" in value:
+        parts = [float(part) for part in value.split(":")]
+        if len(parts) == 2:
+            parts.insert(0, 0)
+        if len(parts) != 3:
+            raise ValueError(f"Unrecognized duration: {value}")
+        hours, minutes, seconds = parts
+        return int(hours * 60 + minutes + seconds / 60)
+    matches = DURATION_PART.findall(value)
+    if not matches or DURATION_PART.sub("", value).strip():
+        raise ValueError(f"Unrecognized duration: {value}")
+    return int(sum(float(number.replace(",", ".")) * DURATION_UNITS.get(unit.lower(), 1) for number, unit in matches))
+
+
+def parse_steps(value):
+    """Adım sayısı; binlik ayraçlı ("8,432" / "8.432") değerler de okunur. Okunamazsa ValueError."""
+    value = value.strip().replace(" ", "")
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", value):
+        value = re.sub(r"[.,]", "", value)
+    return int(float(value))
+
+
+def map_workout_type(name):
+    name = (name or "").lower()
+    for keyword, workout_type in WORKOUT_KEYWORDS:
+        if keyword in name:
+            return workout_type
+    return DEFAULT_WORKOUT
+
+
+def _find_column(fieldnames, candidates):
+    for field in fieldnames:
+        if field.strip().lower() in candidates:
+            return field
+    return None
+
+
+def parse_csv(stream):
+    """
+    CSV satırlarını okur. Adım satırları gün bazında toplanır ({"kind": "steps"}),
+    süre içeren satırlar antrenman olur ({"kind": "workout"}). Tarihi, süresi veya adımı
+    okunamayan satırlar {"kind": "invalid"} olarak döner (içe aktarmada atlanan sayılır).
+    """
+    reader = csv.DictReader(stream)
+    fieldnames = reader.fieldnames or []
+    date_col = _find_column(fieldnames, DATE_COLUMNS)
+    step_col = _find_column(fieldnames, STEP_COLUMNS)
+    type_col = _find_column(fieldnames, TYPE_COLUMNS)
+    duration_col = _find_column(fieldnames, DURATION_COLUMNS)
+    if not date_col or not (step_col or duration_col):
+        raise ValueError("CSV must have a date column and a steps or duration column")
+
+    daily_steps = {}
+    for row in reader:
+        try:
+            when = parse_date(row[date_col])
+            if duration_col and row.get(duration_col):
+                minutes = parse_duration(row[duration_col])
+                if minutes > 0:
+                    yield {"kind": "workout", "date": when, "minutes": minutes,
+                           "workout_type": map_workout_type(row.get(type_col) if type_col else "")}
+            elif step_col and row.get(step_col):
+                day = when.date().isoformat()
+                daily_steps[day] = daily_steps.get(day, 0) + parse_steps(row[step_col])
+        except (ValueError, TypeError, AttributeError):
+            yield {"kind": "invalid"}
+
+    for day, steps in daily_steps.items():
+        yield {"kind": "steps", "date": datetime.fromisoformat(day), "steps": steps}
+
+
+def parse_gpx(stream):
+    """Her <trk> bir antrenman: süre ilk ve son trkpt zamanından, tür <type> alanından."""
+    first = last = None
+    track_type = None
+    for _, elem in ET.iterparse(stream, events=("end",)):
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if tag == "trkpt":
+            for child in elem:
+                if child.tag.rsplit("}", 1)[-1] == "time" and child.text:
+                    when = parse_date(child.text)
+                    first = first or when
+                    last = when
+            elem.clear()
+        elif tag == "type" and elem.text:
+            track_type = elem.text
+        elif tag == "trk":
+            if first and last:
+                minutes = int((last - first).total_seconds() // 60)
+                if minutes > 0:
+                    yield {"kind": "workout", "date": first, "minutes": minutes,
+                           "workout_type": map_workout_type(track_type)}
+            first = last = None
+            track_type = None
+            elem.clear()
+
+
+def to_activity(record):
+    """Ayrıştırılmış kaydı ödülüyle birlikte aktiviteye çevirir; ödülsüz veya okunamamışsa None."""
+    if record["kind"] == "invalid":
+        return None
+    date = record["date"].isoformat()
+    if record["kind"] == "steps":
+        tier_name = None
+        for name, tier in WALK_TIERS.items():
+            if record["steps"] >= tier["steps"]:
+                tier_name = name
+        if not tier_name:
+            return None
+        tier = WALK_TIERS[tier_name]
+        return {
+            "date": date,
+            "type": "Cardio",
+            "description": f"Yürüyüş: {tier_name} ({record['steps']} adım, içe aktarıldı)",
+            "xp_reward": tier["xp"],
+            "stat_rewards": {"AGI": tier["agi"]},
+            "import_key": f"steps:{date[:10]}",
+        }
+
+    xp_reward, stat_rewards = Character.calculate_workout_rewards(record["workout_type"], record["minutes"])
+    return {
+        "date": date,
+        "type": record["workout_type"].split(" ")[0],
+        "description": f"{record['workout_type']} ({record['minutes']} dk, içe aktarıldı)",
+        "xp_reward": xp_reward,
+        "stat_rewards": stat_rewards,
+        "import_key": f"workout:{date[:16]}:{record['minutes']}",
+    }
+
+
+def import_activities(character, stream, filename, direct=False):
+    """
+    Dosyadaki aktiviteleri karaktere uygular ve bir kez kaydeder.
+    character eksiksiz geçmişe sahip olmalı (tekrarlar geçmişe göre ayıklanır).
+    direct=True: günlük yerine doğrudan veritabanına yazılır (komut satırından çalışırken).
+    Döner: {"imported": n, "skipped": n, "xp": toplam}
+    """
+    if filename.lower().endswith(".gpx"):
+        records = parse_gpx(stream)
+    else:
+        records = parse_csv(io.TextIOWrapper(stream, encoding="utf-8-sig") if not isinstance(stream, io.TextIOBase) else stream)
+
+    # Tekrar kontrolü: daha önce içe aktarılanlar ve elle girilmiş adım günleri
+    seen = {entry["import_key"] for entry in character.history if entry.get("import_key")}
+    seen.update(f"steps:{entry['date'][:10]}" for entry in character.history if entry.get("type") == "Cardio")
+
+    batch = []
+    skipped = 0
+    for record in records:
+        activity = to_activity(record)
+        if not activity or activity["import_key"] in seen:
+            skipped += 1
+            continue
+        seen.add(activity["import_key"])
+        batch.append(activity)
+
+    if batch:
+        character.log_activities(batch)
+        GameSystem.save_character(character, direct=direct)
+    return {"imported": len(batch), "skipped": skipped, "xp": sum(a["xp_reward"] for a in batch)}
+
+
+if __name__ == "__main__":
+    # python importer.py <kahraman adı> <dosya.csv|dosya.gpx>
+    if len(sys.argv) != 3:
+        print("Usage: python importer.py <character name> <export.csv|export.gpx>")
+        sys.exit(1)
+    from journal import pending_names
+
+    name, path = sys.argv[1], sys.argv[2]
+    # Uygulamanın günlüğü bu süreçte açılmaz; bekleyen yazımı olan karakter ezilmesin diye beklenir
+    if name in pending_names():
+        print(f"{name} has changes the app has not synced yet; try again in a moment.")
+        sys.exit(1)
+    character = GameSystem.load_character(name, direct=True)
+    if not character:
+        print(f"Character not found: {name}")
+        sys.exit(1)
+    with open(path, "rb") as f:
+        result = import_activities(character, f, path, direct=True)
+    print(f"Imported {result['imported']} activities (+{result['xp']} XP), skipped {result['skipped']}.")
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Yazma Günlüğü (Write Journal)
+# Her karakter yazımı önce diske eklenir ve hemen onaylanır; veritabanına arka planda,
+# toplu olarak aktarılır. Uygulama yeniden başlarsa aktarılmamış kayıtlar günlükten geri yüklenir.
+JOURNAL_DIR = os.environ.get("RPG_JOURNAL_DIR", "data")
+JOURNAL_FSYNC_BATCH = 20        # bu kadar kayıtta bir fsync
+JOURNAL_FSYNC_INTERVAL = 0.5    # veya son fsync'ten bu kadar saniye sonra
+JOURNAL_REPLAY_BATCH = 50       # tek upsert'te gönderilen kayıt sayısı
+JOURNAL_REPLAY_INTERVAL = 5     # saniye; veritabanı erişilemezken tekrar deneme aralığı
+JOURNAL_COMPACT_BYTES = 1_000_000
+
+
+def read_pending(path, checkpoint_path):
+    """
+    Günlük dosyasından (son sıra numarası, isim -> (seq, ts, satır)) okur.
+    Sadece okur; bakım komutları uygulamanın bekleyen yazımlarını görmek için de kullanır.
+    """
+    acked = 0
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            acked = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        pass
+    seq = acked
+    pending = OrderedDict()
+
+    if not os.path.exists(path):
+        return seq, pending
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Çökme sırasında yarım kalmış son satır
+                continue
+            seq = max(seq, record["seq"])
+            if record["seq"] > acked:
+                name = record["payload"]["name"]
+                pending.pop(name, None)
+                pending[name] = (record["seq"], record["ts"], line.rstrip("\n"))
+    return seq, pending
+
+
+def pending_names(directory=JOURNAL_DIR):
+    """Günlükte veritabanına henüz aktarılmamış yazımı olan karakterler."""
+    return {payload["name"] for payload in pending_payloads(directory)}
+
+
+def pending_payloads(directory=JOURNAL_DIR):
+    """Günlükte veritabanına henüz aktarılmamış son yazımlar (karakter başına bir tane)."""
+    _, pending = read_pending(os.path.join(directory, "journal.log"), os.path.join(directory, "journal.checkpoint"))
+    return [json.loads(line)["payload"] for _, _, line in pending.values()]
+
+
+class WriteJournal:
+    def __init__(self, directory=JOURNAL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "journal.log")
+        self.checkpoint_path = os.path.join(directory, "journal.checkpoint")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = OrderedDict()  # isim -> (seq, ts, satır); karakter başına son yazım
+        self._seq = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._compacted_bytes = 0  # son sıkıştırma sonrası boyut (sadece bekleyenler)
+        self._thread = None
+        self.last_error = None
+        self.last_replay = None
+        self._recover()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _recover(self):
+        """Checkpoint'ten sonraki kayıtları bekleyenler listesine geri yükler."""
+        self._seq, self._pending = read_pending(self.path, self.checkpoint_path)
+
+    def append(self, payload):
+        """Kaydı günlüğe yazar ve sıra numarasını döner. Veritabanını beklemez."""
+        with self._lock:
+            self._seq += 1
+            ts = time.time()
+            line = json.dumps({"seq": self._seq, "ts": ts, "payload": payload})
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= JOURNAL_FSYNC_BATCH or time.monotonic() - self._last_sync >= JOURNAL_FSYNC_INTERVAL:
+                self._sync()
+            name = payload["name"]
+            self._pending.pop(name, None)
+            self._pending[name] = (self._seq, ts, line)
+            seq = self._seq
+        self._wake.set()
+        return seq
+
+    def _sync(self):
+        # Kilit altında çağrılır
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def pending_payloads(self):
+        """Henüz veritabanına aktarılmamış son yazımlar (okumaları güncel tutmak için)."""
+        with self._lock:
+            lines = [line for _, _, line in self._pending.values()]
+        return [json.loads(line)["payload"] for line in lines]
+
+    def pending_payload(self, name):
+        """Bir karakterin bekleyen son yazımı, yoksa None."""
+        with self._lock:
+            record = self._pending.get(name)
+        return json.loads(record[2])["payload"] if record else None
+
+    def replay(self, upsert_batch):
+        """
+        Bekleyen kayıtları JOURNAL_REPLAY_BATCH'lik gruplar halinde upsert_batch'e verir.
+        upsert_batch hata fırlatırsa kayıtlar günlükte kalır ve sonra tekrar denenir.
+        """
+        while True:
+            with self._lock:
+                batch = list(self._pending.items())[:JOURNAL_REPLAY_BATCH]
+            if not batch:
+                return
+            upsert_batch([json.loads(line)["payload"] for _, (_, _, line) in batch])
+            with self._lock:
+                for name, (seq, _, _) in batch:
+                    # Bu sırada aynı karaktere daha yeni bir yazım geldiyse o beklemeye devam eder
+                    if name in self._pending and self._pending[name][0] == seq:
+                        del self._pending[name]
+                self._write_checkpoint()
+                self.last_replay = time.time()
+                self.last_error = None
+
+    def _write_checkpoint(self):
+        # Kilit altında çağrılır. Bekleyen en eski kayıttan öncesi aktarılmış sayılır.
+        acked = min(seq for seq, _, _ in self._pending.values()) - 1 if self._pending else self._seq
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(acked))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        # Kilit altında çağrılır
+        # Bekleyenlerin kendisi büyükse her turda yeniden yazmamak için eşik en az iki katı
+        if self._file.tell() > max(JOURNAL_COMPACT_BYTES, 2 * self._compacted_bytes):
+            self._compact()
+
+    def _compact(self):
+        # Kilit altında çağrılır. Günlüğü sadece bekleyen kayıtlarla yeniden yazar.
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for _, _, line in self._pending.values():
+                f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._compacted_bytes = self._file.tell()
+        self._unsynced = 0
+
+    def start(self, upsert_batch):
+        """Arka plan aktarım iş parçacığını başlatır (bir kez)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(upsert_batch,), daemon=True, name="write-journal")
+            self._thread.start()
+
+    def _run(self, upsert_batch):
+        while True:
+            self._wake.wait(JOURNAL_REPLAY_INTERVAL)
+            self._wake.clear()
+            with self._lock:
+                self._sync()
+                # Aktarım uzun süre başarısız olsa da (ör. veritabanı yok) günlük sınırsız büyümesin
+                self._maybe_compact()
+            try:
+                self.replay(upsert_batch)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Journal replay failed: {e}")
+                # Veritabanı erişilemez: bir sonraki aralığa kadar bekle
+                time.sleep(JOURNAL_REPLAY_INTERVAL)
+
+    def status(self):
+        """Eğitmen paneli için günlük gecikmesi."""
+        with self._lock:
+            pending = len(self._pending)
+            oldest = min((ts for _, ts, _ in self._pending.values()), default=None)
+        return {
+            "pending": pending,
+            "lag_seconds": time.time() - oldest if oldest else 0.0,
+            "last_error": self.last_error,
+            "last_replay": self.last_replay,
+        }
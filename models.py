@@ -1,14 +1,48 @@
 import json
 import os
 import hashlib
+import time
 from datetime import datetime
 import uuid
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
 import streamlit as st
-from supabase import create_client, Client
+from journal import WriteJournal
+from achievements import ACHIEVEMENT_ENGINE
 
 # Sabitler
 XP_PER_LEVEL_MULTIPLIER = 1000
 
+# Adım Görevleri (steps: kademeye girmek için gereken en az adım)
+WALK_TIERS = {
+    "7k Adım - Devriye Gezintisi": {"xp": 30, "agi": 5, "steps": 7000},
+    "10k Adım - Hazine Avı": {"xp": 50, "agi": 10, "steps": 10000},
+    "15k Adım - Efsanevi Yolculuk": {"xp": 100, "agi": 15, "steps": 15000},
+}
+
+# Eğitmen grupları: her karakter bir gruba aittir, eğitmen sadece kendi grubunu görür
+DEFAULT_GROUP = "default"
+LEGACY_ADMIN_PASSWORD = "admin123"  # groups tablosunda kaydı olmayan varsayılan grup için
+
+# Idempotency: aynı form gönderiminin tekrarını yakalamak için bakılan pencere
+IDEMPOTENCY_WINDOW = 50
+
+# Oturumda tutulan son aktivite sayısı; daha eskiler sayfa sayfa istenir
+SESSION_HISTORY_WINDOW = 20
+HISTORY_PAGE_SIZE = 20
+
+# İlerleme grafikleri: karakter başına tutulan seri bu kadar noktayı geçince seyreltilir
+PROGRESS_MAX_POINTS = 200
+
+# Eğitmen paneli öğrenci araması (sunucu tarafında, sayfalı)
+STUDENT_PAGE_SIZE = 50
+STUDENT_SUMMARY_COLUMNS = "name,email,level,xp,str,agi,vit,wis,last_activity_at"
+
+# Toplu okuma (dışa aktarma, bakım işleri) için sayfa boyutu
+CHARACTER_PAGE_SIZE = 200
+
 # Antrenman Katsayıları
 WORKOUT_MULTIPLIERS = {
     "Ağırlık (STR)": {"xp_mult": 1.2, "primary": "STR", "secondary": "VIT"},
@@ -17,6 +51,27 @@ WORKOUT_MULTIPLIERS = {
     "HIIT (AGI)": {"xp_mult": 1.1, "primary": "AGI", "secondary": "STR"},
 }
 
+# Başlangıç Profili
+# RPG_PROFILE_STARTUP=1 (veya ?profile=startup) ile import ve başlatma süreleri raporlanır
+PROFILE_STARTUP = os.environ.get("RPG_PROFILE_STARTUP") == "1"
+STARTUP_TIMINGS = {}
+
+@contextmanager
+def startup_timer(label):
+    """Bloğun süresini STARTUP_TIMINGS içine (saniye) yazar."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup_timing(label, time.perf_counter() - start)
+
+def record_startup_timing(label, seconds):
+    # İlk (soğuk) ölçüm saklanır; sonraki rerun'lar üzerine yazmaz
+    if label not in STARTUP_TIMINGS:
+        STARTUP_TIMINGS[label] = seconds
+        if PROFILE_STARTUP:
+            print(f"[startup] {label}: {seconds * 1000:.1f} ms")
+
 # Supabase Setup
 # Try to get secrets from Streamlit secrets, environment, or local file
 def get_supabase_client():
@@ -49,32 +104,103 @@ def get_supabase_client():
 
     if not url or not key:
         raise ValueError("Supabase credentials not found! Please check .streamlit/secrets.toml or Streamlit Cloud Secrets.")
-        
+
+    # Ağır import: sadece ilk veritabanı erişiminde yüklenir
+    with startup_timer("import: supabase"):
+        from supabase import create_client
     return create_client(url, key)
 
-# Initialize Client
-try:
-    supabase: Client = get_supabase_client()
-except Exception as e:
-    # Fail gracefully if secrets aren't set yet (e.g. during initial setup)
-    print(f"Warning: {e}")
-    supabase = None
+# Client ilk kullanımda oluşturulur (import sırasında değil)
+_supabase = None
+_supabase_initialized = False
+_supabase_lock = threading.Lock()
+
+def get_client():
+    global _supabase, _supabase_initialized
+    if _supabase_initialized:
+        return _supabase
+    with _supabase_lock:
+        if not _supabase_initialized:
+            try:
+                with startup_timer("init: supabase client"):
+                    _supabase = get_supabase_client()
+            except Exception as e:
+                # Fail gracefully if secrets aren't set yet (e.g. during initial setup)
+                print(f"Warning: {e}")
+                _supabase = None
+            _supabase_initialized = True
+    return _supabase
+
+def merge_history(data, base):
+    """
+    Lean (son N kayıtlık) bir karakter verisini daha eksiksiz bir kayıtla birleştirir.
+    data["history_offset"] kadar eski aktivite base'in geçmişinden alınır.
+    """
+    offset = data.get("history_offset", 0)
+    if not offset or base is None:
+        return data
+    base_offset = base.get("history_offset", 0)
+    if base_offset > offset:
+        return data
+    merged = dict(data)
+    merged["history"] = base.get("history", [])[:offset - base_offset] + data["history"]
+    merged["history_offset"] = base_offset
+    return merged
 
 class Character:
-    def __init__(self, name, char_class, password, email="", avatar_id="warrior_male", level=1, xp=0, stats=None, history=None):
+    def __init__(self, name, char_class, password, email="", avatar_id="warrior_male", level=1, xp=0, stats=None, history=None, group_id=DEFAULT_GROUP, history_offset=0, progress=None, achievements=None, last_activity_at=None):
         self.name = name
         self.char_class = char_class
         self.email = email
+        self.group_id = group_id or DEFAULT_GROUP
         self.password = self._hash_password(password) if len(password) < 64 else password
         self.avatar_id = avatar_id
         self.level = level
         self.xp = xp
         self.stats = stats if stats else self._get_initial_stats()
         self.history = history if history else []
+        # Bellekte tutulmayan eski aktivite sayısı (lean oturum görünümü için > 0)
+        self.history_offset = history_offset
+        # En yeni aktivitenin tarihi. İçe aktarılan eski tarihli kayıtlar geçmişin sonuna eklendiği
+        # için history[-1] değil, eklenen kayıtların en büyük tarihi tutulur (bkz. _append_entry)
+        self.last_activity_at = last_activity_at or self.latest_activity_date(self.history)
+        # Ödül uygulandıkça güncellenen ilerleme serisi (bkz. _record_progress)
+        self.progress = progress if progress else self._new_progress()
+        # Başarım/görev kurallarının karakter başına durumu (bkz. achievements.py)
+        self.achievements = achievements if achievements else ACHIEVEMENT_ENGINE.new_state()
+        # Son kayıttan beri eklenen / değişen aktiviteler (değişiklik akışı için, kaydedilmez)
+        self._changed_entries = []
+
+    @staticmethod
+    def latest_activity_date(history):
+        return max((entry["date"] for entry in history), default=None)
+
+    def _append_entry(self, entry):
+        """Geçmiş yalnızca sona ekleyerek büyür (history_offset / merge_history buna dayanır)."""
+        self.history.append(entry)
+        self._changed_entries.append(entry)
+        if not self.last_activity_at or entry["date"] > self.last_activity_at:
+            self.last_activity_at = entry["date"]
+
+    def recent_history(self, count):
+        """Bellekteki geçmişin tarihe göre en yeni `count` aktivitesi, yeniden eskiye."""
+        return sorted(self.history, key=lambda e: e["date"], reverse=True)[:count]
 
     def _get_initial_stats(self):
         return {"STR": 10, "AGI": 10, "VIT": 10, "WIS": 10}
 
+    @staticmethod
+    def _new_progress():
+        return {
+            "total_xp": 0,
+            "counter": 0,
+            "stride": 1,
+            "points": [],      # [tarih, toplam_xp, seviye, STR, AGI, VIT, WIS]; her `stride` ödülde bir
+            "latest": None,    # en son nokta (seyreltmeden bağımsız)
+            "level_ups": [],   # [tarih, seviye]
+            "types": {},       # aktivite tipi -> [adet, xp]
+        }
+
     def _hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
 
@@ -100,8 +226,14 @@ class Character:
         for stat in self.stats:
             self.stats[stat] += 1
 
-    def log_activity(self, activity_type, description, xp_reward, stat_rewards=None, proof_image=None):
-        """Aktivite kaydeder."""
+    def log_activity(self, activity_type, description, xp_reward, stat_rewards=None, proof_image=None, idempotency_key=None):
+        """
+        Aktivite kaydeder. Aynı idempotency_key ile tekrar gelirse (çift tıklama / yeniden bağlanma)
+        kaydetmez ve False döner. Tekrar gönderimlerin ayıklandığı tek yer burasıdır.
+        """
+        if idempotency_key and self.find_by_idempotency_key(idempotency_key):
+            return False
+
         activity_id = f"{self.name}_{str(uuid.uuid4())[:8]}"
 
         entry = {
@@ -115,31 +247,158 @@ class Character:
             "status": "pending" if (proof_image or activity_type == "Extra") else "approved",
             "admin_bonus_applied": False,
         }
+        if idempotency_key:
+            entry["idempotency_key"] = idempotency_key
         
         if entry["status"] == "approved":
             self._apply_rewards(activity_type, xp_reward, stat_rewards)
         
-        self.history.append(entry)
+        self._append_entry(entry)
+        if entry["status"] == "approved":
+            self._evaluate_achievements(entry)
+        return True
+
+    def log_activities(self, items):
+        """
+        Toplu aktivite kaydı (ör. içe aktarma). items: date, type, description, xp_reward, stat_rewards,
+        import_key alanlı sözlükler. Hepsi onaylı eklenir; seviye atlama en sonda bir kez hesaplanır.
+        Eski tarihli kayıtlar da gelebildiği için ilerleme serisi en sonda geçmişten, tarih sırasıyla
+        yeniden oluşturulur (her geçilen seviye kendi tarihiyle). Eksiksiz geçmiş gerektirir.
+        """
+        for item in sorted(items, key=lambda i: i["date"]):
+            entry = {
+                "id": f"{self.name}_{str(uuid.uuid4())[:8]}",
+                "date": item["date"],
+                "type": item["type"],
+                "description": item["description"],
+                "xp_reward": item["xp_reward"],
+                "stat_rewards": item["stat_rewards"],
+                "proof_image": None,
+                "status": "approved",
+                "admin_bonus_applied": False,
+                "import_key": item["import_key"],
+            }
+            self._apply_rewards(entry["type"], entry["xp_reward"], entry["stat_rewards"], date=entry["date"], defer_level_up=True)
+            self._append_entry(entry)
+            self._evaluate_achievements(entry, defer_level_up=True)
 
-    def _apply_rewards(self, activity_type, xp_reward, stat_rewards):
+        self.check_level_up()
+        if items:
+            data = self.to_dict()
+            data["history"] = sorted(self.history, key=lambda e: e["date"])
+            self.progress = self.build_progress(data)
+
+    def _evaluate_achievements(self, entry, defer_level_up=False):
+        """
+        Onaylanan aktiviteyi başarım kurallarına verir; kazanılanların ödülü aktivite olarak eklenir.
+        defer_level_up: toplu kayıt içinde; ödül aktivitenin tarihiyle eklenir, seviye kontrolü çağırana kalır.
+        """
+        for rule in ACHIEVEMENT_ENGINE.on_approved(self.achievements, entry):
+            reward = rule.reward
+            description = f"🏆 {rule.title}: {rule.description}"
+            if not defer_level_up:
+                self.log_activity("Achievement", description, reward.get("xp", 0), reward.get("stats"))
+                continue
+            self._apply_rewards("Achievement", reward.get("xp", 0), reward.get("stats"), defer_level_up=True)
+            achievement = {
+                "id": f"{self.name}_{str(uuid.uuid4())[:8]}",
+                "date": entry["date"],
+                "type": "Achievement",
+                "description": description,
+                "xp_reward": reward.get("xp", 0),
+                "stat_rewards": reward.get("stats"),
+                "proof_image": None,
+                "status": "approved",
+                "admin_bonus_applied": False,
+            }
+            self._append_entry(achievement)
+
+    def pop_changed_entries(self):
+        """Son kayıttan beri eklenen / durumu değişen aktiviteler (her id bir kez) ve listeyi sıfırlar."""
+        changed = {entry["id"]: entry for entry in self._changed_entries}
+        self._changed_entries = []
+        return list(changed.values())
+
+    def find_by_idempotency_key(self, idempotency_key):
+        """Son IDEMPOTENCY_WINDOW kayıt içinde aynı anahtarlı aktiviteyi arar."""
+        for entry in reversed(self.history[-IDEMPOTENCY_WINDOW:]):
+            if entry.get("idempotency_key") == idempotency_key:
+                return entry
+        return None
+
+    def _apply_rewards(self, activity_type, xp_reward, stat_rewards, date=None, defer_level_up=False):
         # Sınıf Bonusları Kontrolü
         bonus_xp = 0
         if self.char_class == "Savaşçı" and activity_type == "Strength":
             bonus_xp = int(xp_reward * 0.10)
         
         total_xp = xp_reward + bonus_xp
-        self.add_xp(total_xp)
+        level_before = self.level
+        if defer_level_up:
+            # Toplu kayıt: seviye kontrolü ve ilerleme serisi çağıran tarafından en sonda yapılır
+            self.xp += total_xp
+        else:
+            self.add_xp(total_xp)
 
         if stat_rewards:
             for stat, amount in stat_rewards.items():
                 if stat in self.stats:
                     self.stats[stat] += amount
 
+        if defer_level_up:
+            return
+        self._record_progress(activity_type, total_xp, level_before, date or datetime.now().isoformat())
+
+    def _record_progress(self, activity_type, total_xp, level_before, date):
+        """
+        İlerleme serisine artımlı olarak bir ödül ekler (O(1), amortize).
+        Nokta sayısı PROGRESS_MAX_POINTS'i geçince her ikinci nokta atılır ve adım ikiye katlanır;
+        böylece uzun geçmişler de sınırlı sayıda noktayla çizilir.
+        """
+        p = self.progress
+        p["total_xp"] += total_xp
+        p["counter"] += 1
+        point = [date[:16], p["total_xp"], self.level,
+                 self.stats.get("STR", 0), self.stats.get("AGI", 0), self.stats.get("VIT", 0), self.stats.get("WIS", 0)]
+        p["latest"] = point
+        if p["counter"] % p["stride"] == 0:
+            p["points"].append(point)
+            if len(p["points"]) > PROGRESS_MAX_POINTS:
+                p["points"] = p["points"][1::2]
+                p["stride"] *= 2
+
+        for level in range(level_before + 1, self.level + 1):
+            p["level_ups"].append([date[:16], level])
+
+        counts = p["types"].setdefault(activity_type, [0, 0])
+        counts[0] += 1
+        counts[1] += total_xp
+
+    def progress_series(self):
+        """Grafik için noktalar (seyreltilmiş seri + en son nokta)."""
+        points = list(self.progress["points"])
+        latest = self.progress["latest"]
+        if latest and (not points or points[-1] != latest):
+            points.append(latest)
+        return points
+
+    @classmethod
+    def build_progress(cls, data):
+        """İlerleme serisi olmayan eski kayıtlar için seriyi geçmişten bir kez oluşturur."""
+        replay = cls(name=data["name"], char_class=data["char_class"], password="0" * 64)
+        for entry in data.get("history", []):
+            if entry.get("status") == "approved":
+                replay._apply_rewards(entry["type"], entry.get("xp_reward", entry.get("xp_gained", 0)),
+                                      entry.get("stat_rewards"), date=entry["date"])
+        return replay.progress
+
     def approve_activity(self, activity_id):
         for entry in self.history:
             if entry.get("id") == activity_id and entry["status"] == "pending":
                 entry["status"] = "approved"
+                self._changed_entries.append(entry)
                 self._apply_rewards(entry["type"], entry["xp_reward"], entry["stat_rewards"])
+                self._evaluate_achievements(entry)
                 return True
         return False
 
@@ -147,6 +406,9 @@ class Character:
         for entry in self.history:
             if entry.get("id") == activity_id and entry["status"] == "pending":
                 entry["status"] = "rejected"
+                # Saklama süresi (storage.py) gönderimden değil reddedilme anından sayılır
+                entry["rejected_at"] = datetime.now().isoformat()
+                self._changed_entries.append(entry)
                 return True
         return False
 
@@ -155,13 +417,18 @@ class Character:
             "name": self.name,
             "char_class": self.char_class,
             "email": self.email,
+            "group_id": self.group_id,
             "password": self.password,
             "avatar_id": self.avatar_id,
             "level": self.level,
             "xp": self.xp,
             "stats": self.stats,
             "stats": self.stats,
-            "history": self.history
+            "history": self.history,
+            "history_offset": self.history_offset,
+            "progress": self.progress,
+            "achievements": self.achievements,
+            "last_activity_at": self.last_activity_at,
         }
 
     @staticmethod
@@ -210,8 +477,25 @@ class Character:
             level=int(data["level"]), 
             xp=int(data["xp"]), 
             stats=data["stats"],
-            history=data.get("history", [])
+            history=data.get("history", []),
+            group_id=data.get("group_id", DEFAULT_GROUP),
+            history_offset=data.get("history_offset", 0),
+            progress=data.get("progress") or (cls.build_progress(data) if not data.get("history_offset") else None),
+            achievements=data.get("achievements"),
+            last_activity_at=data.get("last_activity_at")
         )
+
+    @classmethod
+    def session_view(cls, data, window=SESSION_HISTORY_WINDOW):
+        """Oturum için hafif karakter: kimlik, seviye/xp/stat ve sadece son `window` aktivite."""
+        history = data.get("history", [])
+        lean = dict(data)
+        # İlerleme serisi eksiksiz geçmişten, kırpmadan önce oluşturulur
+        lean["progress"] = data.get("progress") or cls.build_progress(data)
+        lean["last_activity_at"] = data.get("last_activity_at") or cls.latest_activity_date(history)
+        lean["history"] = history[-window:]
+        lean["history_offset"] = data.get("history_offset", 0) + len(history) - len(lean["history"])
+        return cls.from_dict(lean)
     
     def get_avatar_image(self):
         # Determine base gender from initial avatar_id or defaults
@@ -239,42 +523,419 @@ class Character:
         # Fallback if image missing
         return f"assets/avatars/{gender}_1.png"
 
+# Change Feed
+# save_character her yazımda kompakt bir olay yayınlar; eğitmen görünümleri bu olayları
+# önbellekteki listeye delta olarak uygular. Diğer süreçlerin yazımları updated_at ile yoklanır.
+CHANGE_FEED_MAXLEN = 500
+CHANGE_POLL_INTERVAL = 10  # saniye
+
+class ChangeFeed:
+    """Bir abonenin (ör. eğitmen oturumu) bekleyen değişiklik olayları."""
+    def __init__(self, group_id=None):
+        self.group_id = group_id
+        self.events = deque(maxlen=CHANGE_FEED_MAXLEN)
+        self.overflowed = False
+        self.cursor = datetime.now().isoformat()  # poll için son görülen updated_at
+        self.last_poll = time.monotonic()
+        self.versions = {}  # isim -> uygulanan son updated_at
+
+    def push(self, event):
+        if len(self.events) == self.events.maxlen:
+            # Kaçırılan olay var: abone tam yeniden yükleme yapmalı
+            self.overflowed = True
+        self.events.append(event)
+
+    def drain(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+_subscribers = weakref.WeakSet()
+_subscribers_lock = threading.Lock()
+
+# Yazma günlüğü ilk kullanımda açılır; açılışta aktarılmamış kayıtlar geri yüklenir
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                journal = WriteJournal()
+                journal.start(GameSystem._upsert_batch)
+                _journal = journal
+    return _journal
+
+
 class GameSystem:
     @staticmethod
-    def load_characters():
+    def load_characters(group_id=None):
+        """Karakterleri yükler. group_id verilirse sadece o grubun satırları okunur."""
+        rows = {}
+        supabase = get_client()
+        if supabase:
+            try:
+                # Fetch characters from Supabase (scoped to the trainer's group if given)
+                query = supabase.table("characters").select("*")
+                if group_id:
+                    query = query.eq("group_id", group_id)
+                response = query.execute()
+                
+                for row in response.data:
+                    # Ensure name in data matches row name (it should)
+                    rows[row['name']] = row['data']
+            except Exception as e:
+                print(f"Error loading characters: {e}")
+
+        # Günlükte bekleyen (henüz veritabanına aktarılmamış) yazımlar daha güncel
+        for payload in get_journal().pending_payloads():
+            if not group_id or payload["group_id"] == group_id:
+                rows[payload["name"]] = merge_history(payload["data"], rows.get(payload["name"]))
+
+        # Map 'data' column back to Character objects
+        return {name: Character.from_dict(char_data) for name, char_data in rows.items()}
+
+    @staticmethod
+    def _load_character_data(name, direct=False):
+        """
+        Tek karakterin verisini isimle getirir (günlükte bekleyen yazım varsa onunla birleştirir).
+        direct=True: sadece veritabanı; ayrı süreçler uygulamanın günlüğünü açmaz.
+        """
+        char_data = None
+        supabase = get_client()
+        if supabase:
+            try:
+                response = supabase.table("characters").select("data").eq("name", name).execute()
+                if response.data:
+                    char_data = response.data[0]["data"]
+            except Exception as e:
+                print(f"Error loading character: {e}")
+
+        pending = None if direct else get_journal().pending_payload(name)
+        if pending:
+            char_data = merge_history(pending["data"], char_data)
+        return char_data
+
+    @staticmethod
+    def load_character(name, direct=False):
+        char_data = GameSystem._load_character_data(name, direct)
+        return Character.from_dict(char_data) if char_data else None
+
+    @staticmethod
+    def load_session_character(name):
+        """Giriş için hafif karakter görünümü (son SESSION_HISTORY_WINDOW aktivite)."""
+        char_data = GameSystem._load_character_data(name)
+        return Character.session_view(char_data) if char_data else None
+
+    @staticmethod
+    def load_history_page(name, end, page, page_size=HISTORY_PAGE_SIZE):
+        """
+        history[:end] aralığından bir sayfa döner; sayfalar ekleme sırasıyla, sayfa içi tarihe göre yeniden eskiye.
+        Lean oturumda end = character.history_offset (bellekte olmayan eski kayıtlar).
+        Sadece istenen dilim getirilir (`character_history_slice` RPC); tüm geçmiş indirilmez.
+        """
+        stop = end - page * page_size
+        start = max(0, stop - page_size)
+        if stop <= 0:
+            return []
+
+        # Günlükte bekleyen eksiksiz kayıt veritabanından daha güncel
+        pending = get_journal().pending_payload(name)
+        if pending and not pending["data"].get("history_offset"):
+            entries = pending["data"].get("history", [])[start:stop]
+            return sorted(entries, key=lambda e: e["date"], reverse=True)
+
+        supabase = get_client()
         if not supabase:
-            return {}
+            return []
         try:
-            # Fetch all characters from Supabase
-            response = supabase.table("characters").select("*").execute()
-            
-            # Map 'data' column back to Character objects
-            chars = {}
-            for row in response.data:
-                char_data = row['data']
-                # Ensure name in data matches row name (it should)
-                # char_data['name'] = row['name'] 
-                chars[row['name']] = Character.from_dict(char_data)
-            return chars
-            
+            entries = supabase.rpc("character_history_slice", {"p_name": name, "p_start": start, "p_stop": stop}).execute().data
         except Exception as e:
-            print(f"Error loading characters: {e}")
-            return {}
+            print(f"Error loading history page: {e}")
+            return []
+        return sorted(entries or [], key=lambda e: e["date"], reverse=True)
 
     @staticmethod
-    def save_character(character):
-        if not supabase:
-            return
-        
+    def save_character(character, direct=False):
+        """
+        Yazımı önce diskteki günlüğe ekler ve hemen döner.
+        Veritabanına aktarım arka planda, toplu upsert ile yapılır (bkz. journal.py).
+        direct=True: günlük atlanır, doğrudan ve senkron upsert yapılır. Uygulamanın
+        günlüğünü paylaşmaması gereken ayrı süreçler (bakım/CLI komutları) için.
+        Tekrar gönderimler burada değil Character.log_activity'de (idempotency_key) ayıklanır;
+        kayıt yalnızca yeni aktivite eklendiyse çağrılır.
+        """
         try:
-            # Upsert into Supabase (Insert or Update)
+            char_data = character.to_dict()
+            if char_data["history_offset"] and not direct:
+                # Lean oturum: günlükte bekleyen eksiksiz kayıt varsa eski geçmişi ondan al.
+                # Yoksa birleştirme aktarım sırasında veritabanındaki kayıtla yapılır.
+                pending = get_journal().pending_payload(character.name)
+                if pending:
+                    char_data = merge_history(char_data, pending["data"])
+
             data_payload = {
                 "name": character.name,
-                "data": character.to_dict(),
-                "updated_at": datetime.now().isoformat()
+                "group_id": character.group_id,
+                "data": char_data,
+                "updated_at": datetime.now().isoformat(),
+                # Arama/filtre için indekslenen özet kolonlar
+                "email": character.email,
+                "level": character.level,
+                "xp": character.xp,
+                "str": character.stats.get("STR", 0),
+                "agi": character.stats.get("AGI", 0),
+                "vit": character.stats.get("VIT", 0),
+                "wis": character.stats.get("WIS", 0),
+                "last_activity_at": character.last_activity_at,
             }
             
-            supabase.table("characters").upsert(data_payload).execute()
+            if direct:
+                GameSystem._upsert_batch([data_payload])
+                return
+            get_journal().append(data_payload)
+            GameSystem._publish(data_payload, character.pop_changed_entries())
         except Exception as e:
             print(f"Error saving character: {e}")
             raise e
+
+    @staticmethod
+    def _upsert_batch(payloads):
+        """Günlükten gelen yazımları tek istekte Supabase'e aktarır (Insert or Update)."""
+        supabase = get_client()
+        if not supabase:
+            raise ConnectionError("Supabase client not available")
+
+        # Lean oturum yazımları saklanan eski geçmişle birleştirilir (tek sorguda)
+        lean_names = [p["name"] for p in payloads if p["data"].get("history_offset")]
+        if lean_names:
+            response = supabase.table("characters").select("name,data").in_("name", lean_names).execute()
+            stored = {row["name"]: row["data"] for row in response.data}
+            payloads = [dict(p, data=merge_history(p["data"], stored.get(p["name"]))) for p in payloads]
+
+        # updated_at veritabanına yazıldığı an damgalanır (günlüğe eklendiği an değil): aktarım
+        # gecikse de diğer süreçlerin poll_changes imleci bu yazımı geçmiş olmaz
+        updated_at = datetime.now().isoformat()
+        payloads = [dict(p, updated_at=updated_at) for p in payloads]
+        supabase.table("characters").upsert(payloads).execute()
+
+    @staticmethod
+    def journal_status():
+        return get_journal().status()
+
+    @staticmethod
+    def load_group(group_id):
+        """groups tablosundan grup kaydını getirir, yoksa None."""
+        supabase = get_client()
+        if not supabase:
+            return None
+        try:
+            response = supabase.table("groups").select("*").eq("group_id", group_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error loading group: {e}")
+            return None
+
+    @staticmethod
+    def authenticate_trainer(group_id, password):
+        """Eğitmen şifresini grubun kaydına göre doğrular."""
+        group_id = group_id or DEFAULT_GROUP
+        group = GameSystem.load_group(group_id)
+        if group:
+            return group.get("admin_password") == hashlib.sha256(password.encode()).hexdigest()
+        # Eski kurulumlar: groups tablosu boşken varsayılan grup eski şifreyle açılır
+        return group_id == DEFAULT_GROUP and password == LEGACY_ADMIN_PASSWORD
+
+    @staticmethod
+    def subscribe(group_id=None):
+        """Süreç içi değişiklik akışına abone olur. Abone referansı tutulduğu sürece olay alır."""
+        feed = ChangeFeed(group_id)
+        with _subscribers_lock:
+            _subscribers.add(feed)
+        return feed
+
+    @staticmethod
+    def _publish(data_payload, changed_entries):
+        """
+        Kompakt olay: geçmiş dışındaki alanlar + sadece eklenen / değişen aktiviteler.
+        Değişmez JSON olarak paylaşılır. Abone yoksa hiçbir iş yapılmaz.
+        """
+        with _subscribers_lock:
+            feeds = list(_subscribers)
+        if not feeds:
+            return
+        data = data_payload["data"]
+        fields = {key: value for key, value in data.items() if key not in ("history", "history_offset")}
+        event = {
+            "name": data_payload["name"],
+            "group_id": data_payload["group_id"],
+            "version": data_payload["updated_at"],
+            "delta": json.dumps({"fields": fields, "entries": changed_entries}),
+        }
+        for feed in feeds:
+            if feed.group_id is None or feed.group_id == event["group_id"]:
+                feed.push(event)
+
+    @staticmethod
+    def poll_changes(group_id, since):
+        """updated_at > since olan satırları getirir (realtime yerine sürüm yoklaması)."""
+        supabase = get_client()
+        if not supabase:
+            return []
+        try:
+            query = supabase.table("characters").select("*").gt("updated_at", since)
+            if group_id:
+                query = query.eq("group_id", group_id)
+            return query.execute().data
+        except Exception as e:
+            print(f"Error polling changes: {e}")
+            return []
+
+    @staticmethod
+    def apply_changes(feed, roster):
+        """
+        Bekleyen olayları ve (CHANGE_POLL_INTERVAL'da bir) diğer süreçlerin yazımlarını
+        önbellekteki roster sözlüğüne uygular. Değişen isimleri döner.
+        """
+        changed = set()
+        for event in feed.drain():
+            if event["version"] > feed.versions.get(event["name"], ""):
+                if event["name"] in roster:
+                    # Önbellekteki kayda alanlar ve değişen aktiviteler uygulanır
+                    delta = json.loads(event["delta"])
+                    char_data = roster[event["name"]].to_dict()
+                    char_data.update(delta["fields"])
+                    positions = {entry.get("id"): i for i, entry in enumerate(char_data["history"])}
+                    for entry in delta["entries"]:
+                        if entry["id"] in positions:
+                            char_data["history"][positions[entry["id"]]] = entry
+                        else:
+                            char_data["history"].append(entry)
+                    roster[event["name"]] = Character.from_dict(char_data)
+                else:
+                    # Yeni öğrenci: eksiksiz kayıt tek sorguyla getirilir
+                    char = GameSystem.load_character(event["name"])
+                    if not char:
+                        continue
+                    roster[event["name"]] = char
+                feed.versions[event["name"]] = event["version"]
+                changed.add(event["name"])
+
+        if time.monotonic() - feed.last_poll >= CHANGE_POLL_INTERVAL:
+            feed.last_poll = time.monotonic()
+            for row in GameSystem.poll_changes(feed.group_id, feed.cursor):
+                version = row.get("updated_at") or ""
+                feed.cursor = max(feed.cursor, version)
+                if version > feed.versions.get(row["name"], ""):
+                    roster[row["name"]] = Character.from_dict(row["data"])
+                    feed.versions[row["name"]] = version
+                    changed.add(row["name"])
+        return changed
+
+    @staticmethod
+    def search_students(group_id, query="", fuzzy=False, min_level=None, max_level=None,
+                        inactive_since=None, min_stats=None, page=0, page_size=STUDENT_PAGE_SIZE):
+        """
+        Grubun öğrencilerini sunucu tarafında arar ve (satırlar, toplam) döner.
+        Sadece özet kolonlar okunur; aktivite geçmişi getirilmez.
+        query: isim başlangıcı. fuzzy=True: yazım hatalarına toleranslı benzerlik araması
+        (pg_trgm, `search_students_fuzzy` RPC; isim içinde geçenler de eşleşir), benzerliğe göre sıralı
+        inactive_since: bu tarihten beri aktivitesi olmayanlar
+        min_stats: {"STR": 20, ...} alt sınırlar
+        """
+        supabase = get_client()
+        if not supabase:
+            return [], 0
+        try:
+            if query and fuzzy:
+                q = supabase.rpc("search_students_fuzzy", {"p_group": group_id, "p_query": query}, count="exact")
+            else:
+                q = supabase.table("characters").select(STUDENT_SUMMARY_COLUMNS, count="exact").eq("group_id", group_id)
+            if query and not fuzzy:
+                # Büyük/küçük harf duyarsız önek araması; trigram GIN indeksi (characters_name_trgm_idx)
+                # ILIKE 'önek%' sorgusunu karşılar. PostgREST `*` karakterini `%` yapar ve kaçışı yoktur:
+                # `*` tek karakter joker (`_`) olarak aranır, böylece kendisini de eşler
+                pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "_")
+                q = q.ilike("name", f"{pattern}%")
+            if min_level is not None:
+                q = q.gte("level", min_level)
+            if max_level is not None:
+                q = q.lte("level", max_level)
+            if inactive_since:
+                since = inactive_since.isoformat()
+                q = q.or_(f"last_activity_at.lt.{since},last_activity_at.is.null")
+            for stat, threshold in (min_stats or {}).items():
+                if threshold:
+                    q = q.gte(stat.lower(), threshold)
+
+            if query and fuzzy:
+                q = q.order("score", desc=True)
+            start = page * page_size
+            response = q.order("name").range(start, start + page_size - 1).execute()
+            rows = response.data
+            total = response.count or 0
+        except Exception as e:
+            print(f"Error searching students: {e}")
+            return [], 0
+
+        # Günlükte bekleyen yazımlar daha güncel özet değerler taşır
+        pending = {p["name"]: p for p in get_journal().pending_payloads()}
+        for row in rows:
+            if row["name"] in pending:
+                row.update({col: pending[row["name"]].get(col) for col in STUDENT_SUMMARY_COLUMNS.split(",")})
+        return rows, total
+
+    @staticmethod
+    def load_group_levels(group_id):
+        """Grubun öğrenci seviyeleri (isim -> seviye). Sadece özet kolon okunur; geçmiş getirilmez."""
+        levels = {}
+        supabase = get_client()
+        if supabase:
+            try:
+                start = 0
+                while True:
+                    rows = (supabase.table("characters").select("name,level").eq("group_id", group_id)
+                            .order("name").range(start, start + CHARACTER_PAGE_SIZE - 1).execute().data)
+                    levels.update((row["name"], row["level"]) for row in rows)
+                    if len(rows) < CHARACTER_PAGE_SIZE:
+                        break
+                    start += CHARACTER_PAGE_SIZE
+            except Exception as e:
+                print(f"Error loading group levels: {e}")
+
+        for payload in get_journal().pending_payloads():
+            if payload.get("group_id") == group_id:
+                levels[payload["name"]] = payload.get("level")
+        return levels
+
+    @staticmethod
+    def iter_character_pages(group_id=None, page_size=CHARACTER_PAGE_SIZE):
+        """
+        Karakter satırlarını isim sırasıyla sayfa sayfa üretir (keyset pagination).
+        Aynı anda bellekte sadece bir sayfa bulunur.
+        Okuma başarısız olursa RuntimeError: eksik liste sessizce dönmez (dışa aktarma yarım kalır,
+        storage.py gc okunamayan karakterlerin kanıtlarını yetim sayardı).
+        """
+        supabase = get_client()
+        if not supabase:
+            raise RuntimeError("Supabase client not available")
+        last_name = None
+        while True:
+            query = supabase.table("characters").select("name,group_id,data").order("name").limit(page_size)
+            if group_id:
+                query = query.eq("group_id", group_id)
+            if last_name is not None:
+                query = query.gt("name", last_name)
+            try:
+                rows = query.execute().data
+            except Exception as e:
+                print(f"Error loading characters page: {e}")
+                raise RuntimeError(f"Could not read characters: {e}") from e
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            last_name = rows[-1]["name"]
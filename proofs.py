@@ -0,0 +1,319 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Kanıt Fotoğrafı Kopya Tespiti
+# Her yüklenen görüntünün algısal hash'i (dHash, 64 bit) hesaplanır ve bir BK-tree'de tutulur.
+# Yeniden kullanılan / kırpılıp tekrar yüklenen fotoğraflar, Hamming mesafesi ile
+# tüm öğrenciler arasında doğrusal tarama yapmadan bulunur.
+UPLOAD_DIR = "uploads"
+PHASH_INDEX_PATH = os.path.join(UPLOAD_DIR, ".phash_index.jsonl")
+PHASH_MAX_DISTANCE = 6  # 64 bit içinde bu kadar farklı bit "aynı fotoğraf" sayılır
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+PHASH_COMPACT_MIN_LINES = 1000  # dosya bu kadar satırı ve güncel kaydın iki katını geçince sıkıştırılır
+PHASH_RELOAD_INTERVAL = 2  # saniye; aramalarda indeks dosyası en fazla bu sıklıkla kontrol edilir
+
+
+def dhash(path, hash_size=8):
+    """Fark hash'i: küçültülmüş gri görüntüde yan yana piksellerin parlaklık karşılaştırması."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Hamming mesafesi için BK-tree. Düğüm: [hash, [öğeler], {mesafe: çocuk}]."""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def remove(self, value, item):
+        node = self.root
+        while node is not None:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                if item in node[1]:
+                    node[1].remove(item)
+                return
+            node = node[2].get(distance)
+
+    def search(self, value, max_distance):
+        """max_distance içindeki (mesafe, öğe) çiftleri. Üçgen eşitsizliği ile dallar budanır."""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(results)
+
+
+class ProofHashIndex:
+    """Dosya yolu -> {hash, owner} kayıtları (sadece-ekleme JSONL) ve üzerindeki BK-tree."""
+
+    def __init__(self, index_path=PHASH_INDEX_PATH):
+        self.index_path = index_path
+        self.entries = {}
+        self.tree = BKTree()
+        self._lines = 0
+        self._file_id = None   # okunan dosyanın (inode, aygıt); sıkıştırmada değişir
+        self._offset = 0       # okunan son tam satırın bittiği bayt
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._load()
+        if self._needs_compaction():
+            self.compact()
+
+    def _load(self):
+        self.entries = {}
+        self.tree = BKTree()
+        self._lines = 0
+        self._offset = 0
+        self._read_tail()
+
+    def _read_tail(self):
+        # Kilit altında çağrılır. Son okunan konumdan sonra eklenen satırları uygular.
+        try:
+            with open(self.index_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                self._file_id = (stat.st_ino, stat.st_dev)
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # başka süreçte yazılmakta olan yarım satır
+                    self._offset += len(line)
+                    self._lines += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def _refresh(self, force=False):
+        """
+        Kilit altında çağrılır. Başka süreçlerin (storage.py gc/archive, proofs.py backfill)
+        eklediği satırlar okunur; dosya sıkıştırılıp değiştiyse baştan yüklenir (bkz. storage.UploadIndex).
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < PHASH_RELOAD_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return
+        if (stat.st_ino, stat.st_dev) != self._file_id or stat.st_size < self._offset:
+            self._load()
+        elif stat.st_size > self._offset:
+            self._read_tail()
+
+    def _needs_compaction(self):
+        return self._lines > max(PHASH_COMPACT_MIN_LINES, 2 * len(self.entries))
+
+    def compact(self):
+        """
+        Silinen / üzerine yazılan kayıtları atar. Dosya önce diskten yeniden okunur; böylece
+        başka süreçlerin (storage.py gc/archive) eklediği kayıtlar kaybolmaz.
+        """
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        # Kilit altında çağrılır
+        self._load()
+        tmp_path = self.index_path + ".tmp"
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for path, entry in self.entries.items():
+                f.write(json.dumps({"path": path, "hash": entry["hash"], "owner": entry["owner"]}) + "\n")
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self._file_id = (stat.st_ino, stat.st_dev)
+        self._offset = stat.st_size
+        self._lines = len(self.entries)
+
+    def _apply(self, record):
+        path = record["path"]
+        old = self.entries.pop(path, None)
+        if old:
+            self.tree.remove(int(old["hash"], 16), path)
+        if record.get("removed"):
+            return
+        self.entries[path] = {"hash": record["hash"], "owner": record.get("owner")}
+        self.tree.add(int(record["hash"], 16), path)
+
+    def _append(self, record):
+        # Kilit altında, _refresh(force=True) sonrası çağrılır
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        line = json.dumps(record) + "\n"
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(line)
+        self._offset += len(line.encode("utf-8"))
+        self._lines += 1
+        self._apply(record)
+        if self._needs_compaction():
+            self._compact()
+
+    def add(self, path, owner):
+        """Görüntüyü hash'leyip indekse ekler; görüntü değilse veya okunamazsa None."""
+        if not path.lower().endswith(IMAGE_EXTENSIONS):
+            return None
+        try:
+            value = dhash(path)
+        except Exception as e:
+            print(f"Error hashing proof {path}: {e}")
+            return None
+        with self._lock:
+            self._refresh(force=True)
+            old = self.entries.get(path)
+            # Sahibi bilinmeden gelen kayıt, bilinen sahibi silmez
+            owner = owner or (old["owner"] if old else None)
+            if old != {"hash": f"{value:016x}", "owner": owner}:
+                self._append({"path": path, "hash": f"{value:016x}", "owner": owner})
+        return value
+
+    def set_owner(self, path, owner):
+        """Sahibi olmadan eklenmiş kaydın sahibini, görüntüyü tekrar hash'lemeden doldurur."""
+        with self._lock:
+            self._refresh(force=True)
+            entry = self.entries.get(path)
+            if entry and owner and entry["owner"] is None:
+                self._append({"path": path, "hash": entry["hash"], "owner": owner})
+                return True
+        return False
+
+    def remove(self, path):
+        with self._lock:
+            self._refresh(force=True)
+            if path in self.entries:
+                self._append({"path": path, "removed": True})
+
+    def rename(self, old_path, new_path):
+        """Dosya taşındığında (ör. arşive) hash korunur, yol güncellenir."""
+        with self._lock:
+            self._refresh(force=True)
+            entry = self.entries.get(old_path)
+            if entry:
+                self._append({"path": old_path, "removed": True})
+                self._append({"path": new_path, "hash": entry["hash"], "owner": entry["owner"]})
+
+    def near_duplicates(self, path, max_distance=PHASH_MAX_DISTANCE):
+        """Bu kanıta benzeyen diğer kanıtlar: [{path, owner, distance}]."""
+        with self._lock:
+            self._refresh()
+            entry = self.entries.get(path)
+            if not entry:
+                return []
+            matches = self.tree.search(int(entry["hash"], 16), max_distance)
+            return [
+                {"path": other, "owner": self.entries[other]["owner"], "distance": distance}
+                for distance, other in matches if other != path
+            ]
+
+    def backfill(self, owners=None, directory=UPLOAD_DIR, only_owned=False):
+        """
+        İndekste olmayan mevcut yüklemeleri hash'ler. owners: yol -> öğrenci adı.
+        Sahipsiz eklenmiş kayıtların sahibi owners'tan doldurulur (hash tekrar hesaplanmaz).
+        only_owned=True: dizin taranmaz, sadece owners'taki yollar işlenir (ör. tek grubun kanıtları).
+        Eklenen / sahibi doldurulan kayıt sayısını döner.
+        """
+        owners = owners or {}
+        if only_owned:
+            paths = [path for path in owners if os.path.isfile(path)]
+        elif os.path.isdir(directory):
+            paths = [entry.path for entry in os.scandir(directory) if entry.is_file()]
+        else:
+            paths = []
+        with self._lock:
+            self._refresh(force=True)
+        added = 0
+        for path in paths:
+            if not path.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if path in self.entries:
+                added += self.set_owner(path, owners.get(path))
+            elif self.add(path, owners.get(path)) is not None:
+                added += 1
+        return added
+
+
+_proof_index = None
+_proof_index_lock = threading.Lock()
+
+
+def get_proof_index():
+    global _proof_index
+    if _proof_index is None:
+        with _proof_index_lock:
+            if _proof_index is None:
+                _proof_index = ProofHashIndex()
+    return _proof_index
+
+
+def proof_owners(characters):
+    """Karakter geçmişlerinden kanıt yolu -> öğrenci adı eşlemesi."""
+    return {
+        entry["proof_image"]: char.name
+        for char in characters
+        for entry in char.history
+        if entry.get("proof_image")
+    }
+
+
+if __name__ == "__main__":
+    # python proofs.py backfill|compact
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "backfill":
+        from models import GameSystem
+
+        # Veritabanından sayfa sayfa; uygulamanın yazma günlüğü bu süreçte açılmaz
+        owners = {}
+        for page in GameSystem.iter_character_pages():
+            for row in page:
+                for entry in row["data"].get("history", []):
+                    if entry.get("proof_image"):
+                        owners[entry["proof_image"]] = row["name"]
+        print(f"Hashed {get_proof_index().backfill(owners)} existing uploads.")
+    elif command == "compact":
+        get_proof_index().compact()
+        print(f"Compacted {PHASH_INDEX_PATH} to {len(get_proof_index().entries)} entries.")
+    else:
+        print("Usage: python proofs.py backfill|compact")
+        sys.exit(1)
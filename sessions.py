@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from models import get_client
+
+# Oturum Jetonları
+# Girişte imzalı, süreli bir jeton verilir ve adres çubuğunda (?s=...) tutulur.
+# Sayfa yenilendiğinde / uygulama tekrar açıldığında jeton doğrulanır ve karakter tek
+# anahtarlı sorguyla getirilir; şifre tekrar kontrol edilmez.
+# Jeton: base64url("isim|bitiş|jeton_id") + "." + HMAC-SHA256 imzası
+# Çıkışta jeton_id `revoked_sessions` tablosuna yazılır (sunucu tarafı iptal).
+SESSION_TOKEN_PARAM = "s"
+SESSION_TTL_DAYS = 30
+
+_revoked_cache = set()  # bu süreçte iptal edildiği bilinen jeton id'leri
+_secret = None
+_secret_lock = threading.Lock()
+
+
+def get_session_secret():
+    """İmza anahtarı: Streamlit secrets, ortam değişkeni veya (uyarıyla) süreç başına rastgele."""
+    global _secret
+    if _secret is not None:
+        return _secret
+    with _secret_lock:
+        if _secret is None:
+            secret = None
+            try:
+                secret = st.secrets["session"]["secret"]
+            except Exception:
+                pass
+            if not secret:
+                secret = os.environ.get("SESSION_SECRET")
+            if not secret:
+                # Yeniden başlatmada tüm jetonlar geçersiz olur; öğrenciler tekrar giriş yapar
+                print("Warning: SESSION_SECRET is not set, session tokens will not survive a restart.")
+                secret = secrets.token_hex(32)
+            _secret = secret.encode()
+    return _secret
+
+
+def _sign(payload):
+    return hmac.new(get_session_secret(), payload, hashlib.sha256).hexdigest()
+
+
+def issue_token(name, ttl_days=SESSION_TTL_DAYS):
+    expires = int(time.time()) + ttl_days * 86400
+    payload = f"{name}|{expires}|{uuid.uuid4().hex}".encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=") + "." + _sign(payload)
+
+
+def decode_token(token):
+    """İmzası ve süresi geçerliyse {"name", "expires", "token_id"}, değilse None. Veritabanına gitmez."""
+    try:
+        encoded, signature = token.split(".", 1)
+        payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+            return None
+        name, expires, token_id = payload.decode().rsplit("|", 2)
+        expires = int(expires)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if expires < time.time():
+        return None
+    return {"name": name, "expires": expires, "token_id": token_id}
+
+
+def is_revoked(token_id):
+    if token_id in _revoked_cache:
+        return True
+    supabase = get_client()
+    if not supabase:
+        return True
+    try:
+        response = supabase.table("revoked_sessions").select("token_id").eq("token_id", token_id).limit(1).execute()
+    except Exception as e:
+        # Doğrulanamayan jeton kabul edilmez; öğrenci normal girişe yönlendirilir
+        print(f"Error checking session revocation: {e}")
+        return True
+    if response.data:
+        _revoked_cache.add(token_id)
+        return True
+    return False
+
+
+def verify_token(token):
+    """Geçerli ve iptal edilmemiş jetonun talepleri, değilse None."""
+    claims = decode_token(token)
+    if not claims or is_revoked(claims["token_id"]):
+        return None
+    return claims
+
+
+def revoke_token(token):
+    claims = decode_token(token)
+    if not claims:
+        return
+    _revoked_cache.add(claims["token_id"])
+    supabase = get_client()
+    if not supabase:
+        return
+    try:
+        supabase.table("revoked_sessions").upsert({
+            "token_id": claims["token_id"],
+            "name": claims["name"],
+            "expires_at": datetime.fromtimestamp(claims["expires"], timezone.utc).isoformat(),
+        }).execute()
+    except Exception as e:
+        print(f"Error revoking session: {e}")
@@ -0,0 +1,360 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+
+from proofs import UPLOAD_DIR, get_proof_index
+
+# Yükleme Depolama Bakımı
+# - Referans sayımlı indeks: dosya yolu -> sahibi, boyutu ve onu kullanan aktivite id'leri.
+#   Eğitmen paneli dosya varlığını diskten değil bu indeksten kontrol eder.
+# - Öğrenci başına kota.
+# - GC: hiçbir aktivitenin kullanmadığı (yetim) ve uzun süredir reddedilmiş dosyaları siler.
+# - Arşiv: eski onaylı aktivitelerin kanıtlarını aylık sıkıştırılmış paketlere taşır.
+STORAGE_INDEX_PATH = os.path.join(UPLOAD_DIR, ".storage_index.jsonl")
+ARCHIVE_DIR = os.path.join(UPLOAD_DIR, "archive")
+ARCHIVE_PREFIX = "archive:"  # arşivlenen kanıt yolu: "archive:<paket.zip>::<dosya>"
+STUDENT_UPLOAD_QUOTA_MB = 100
+ORPHAN_GRACE_HOURS = 24        # yeni yüklenip henüz aktiviteye bağlanmamış dosyalar korunur
+REJECTED_RETENTION_DAYS = 30
+ARCHIVE_AFTER_DAYS = 90
+INDEX_RELOAD_INTERVAL = 2      # saniye; okumalarda indeks dosyası en fazla bu sıklıkla kontrol edilir
+INDEX_COMPACT_MIN_LINES = 1000  # dosya bu kadar satırı ve kayıt sayısının iki katını geçince sıkıştırılır
+
+
+class UploadIndex:
+    """
+    Yol -> {owner, size, created, refs} kayıtları. Değişiklikler sadece-ekleme JSONL olarak yazılır
+    (bir yükleme tüm indeksi yeniden yazmaz); dosya büyüyünce güncel kayıtlarla sıkıştırılır.
+    Başka süreçlerin (storage.py gc/archive) eklediği satırlar dosyanın sonundan okunur.
+    """
+
+    def __init__(self, index_path=STORAGE_INDEX_PATH, directory=UPLOAD_DIR):
+        self.index_path = index_path
+        self.directory = directory
+        self.entries = {}   # yol -> {"owner", "size", "created", "refs": [aktivite id]}
+        self.usage = {}     # sahip -> toplam bayt
+        self._lock = threading.Lock()
+        self._file_id = None      # okunan dosyanın (inode, aygıt); sıkıştırmada değişir
+        self._offset = 0          # okunan bayt sayısı
+        self._lines = 0
+        self._last_check = 0.0
+        if os.path.exists(self.index_path):
+            self._load()
+        else:
+            # İlk açılış: mevcut dosyalar sahipsiz olarak eklenir, GC taramasında bağlanır
+            self.entries = {path: {"owner": None, "size": size, "created": mtime, "refs": []}
+                            for path, size, mtime in self.scan_files()}
+            self._compact()
+
+    def _load(self):
+        self.entries = {}
+        self.usage = {}
+        self._offset = 0
+        self._lines = 0
+        self._read_tail()
+
+    def _read_tail(self):
+        # Kilit altında çağrılır. Son okunan konumdan sonra eklenen satırları uygular.
+        try:
+            with open(self.index_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                self._file_id = (stat.st_ino, stat.st_dev)
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # başka süreçte yazılmakta olan yarım satır
+                    self._offset += len(line)
+                    self._lines += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, record):
+        path = record["path"]
+        entry = self.entries.get(path)
+        if "ref" in record:
+            if entry and record["ref"] not in entry["refs"]:
+                entry["refs"].append(record["ref"])
+            return
+        if entry:
+            self.usage[entry["owner"]] = self.usage.get(entry["owner"], 0) - entry["size"]
+            del self.entries[path]
+        if record.get("removed"):
+            return
+        entry = {"owner": record.get("owner"), "size": record["size"],
+                 "created": record["created"], "refs": record.get("refs", [])}
+        self.entries[path] = entry
+        self.usage[entry["owner"]] = self.usage.get(entry["owner"], 0) + entry["size"]
+
+    def _refresh(self, force=False):
+        """
+        Kilit altında çağrılır. Yazmadan önce her zaman, okumalarda aralıklı olarak
+        başka süreçlerin eklediği satırlar okunur; dosya sıkıştırılıp değiştiyse baştan yüklenir.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < INDEX_RELOAD_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return
+        if (stat.st_ino, stat.st_dev) != self._file_id or stat.st_size < self._offset:
+            self._load()
+        elif stat.st_size > self._offset:
+            self._read_tail()
+
+    def _append(self, record):
+        # Kilit altında, _refresh(force=True) sonrası çağrılır
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        line = json.dumps(record) + "\n"
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(line)
+        self._offset += len(line.encode("utf-8"))
+        self._lines += 1
+        self._apply(record)
+        if self._lines > max(INDEX_COMPACT_MIN_LINES, 2 * len(self.entries)):
+            self._compact()
+
+    def _compact(self):
+        # Kilit altında çağrılır. Dosyayı sadece güncel kayıtlarla yeniden yazar.
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for path, entry in self.entries.items():
+                f.write(json.dumps(dict(entry, path=path)) + "\n")
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self._file_id = (stat.st_ino, stat.st_dev)
+        self._offset = stat.st_size
+        self._lines = len(self.entries)
+        self._recount()
+
+    def _recount(self):
+        self.usage = {}
+        for entry in self.entries.values():
+            self.usage[entry["owner"]] = self.usage.get(entry["owner"], 0) + entry["size"]
+
+    def scan_files(self):
+        """Sıcak dizindeki yükleme dosyaları (indeks dosyaları ve arşiv hariç)."""
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def exists(self, path):
+        with self._lock:
+            self._refresh()
+            return path in self.entries
+
+    def has_quota(self, owner, size):
+        with self._lock:
+            self._refresh()
+            return self.usage.get(owner, 0) + size <= STUDENT_UPLOAD_QUOTA_MB * 1024 * 1024
+
+    def register(self, path, owner, size):
+        with self._lock:
+            self._refresh(force=True)
+            old = self.entries.get(path)
+            self._append({"path": path, "owner": owner, "size": size, "created": time.time(),
+                          "refs": old["refs"] if old else []})
+
+    def add_ref(self, path, activity_id):
+        with self._lock:
+            self._refresh(force=True)
+            entry = self.entries.get(path)
+            if entry and activity_id not in entry["refs"]:
+                self._append({"path": path, "ref": activity_id})
+
+    def remove(self, path):
+        with self._lock:
+            self._refresh(force=True)
+            if path in self.entries:
+                self._append({"path": path, "removed": True})
+
+    def reconcile(self, references):
+        """GC taramasından gelen yol -> [(sahip, aktivite id)] eşlemesiyle referansları yeniler."""
+        with self._lock:
+            self._refresh(force=True)
+            known = {path for path, _, _ in self.scan_files()}
+            for path in list(self.entries):
+                if path not in known:
+                    del self.entries[path]
+            for path, size, mtime in self.scan_files():
+                entry = self.entries.setdefault(path, {"owner": None, "size": size, "created": mtime, "refs": []})
+                refs = references.get(path, [])
+                entry["refs"] = [activity_id for _, activity_id in refs]
+                if refs and not entry["owner"]:
+                    entry["owner"] = refs[0][0]
+            self._compact()
+
+    def stats(self, owners=None):
+        """Toplam dosya/bayt ve (verilirse) sadece bu sahiplerin kullanımı."""
+        with self._lock:
+            self._refresh()
+        usage = self.usage if owners is None else {o: self.usage.get(o, 0) for o in owners}
+        return {
+            "files": len(self.entries),
+            "bytes": sum(e["size"] for e in self.entries.values()),
+            "usage": usage,
+        }
+
+
+_upload_index = None
+_upload_index_lock = threading.Lock()
+
+
+def get_upload_index():
+    global _upload_index
+    if _upload_index is None:
+        with _upload_index_lock:
+            if _upload_index is None:
+                _upload_index = UploadIndex()
+    return _upload_index
+
+
+def _delete_upload(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    get_upload_index().remove(path)
+    get_proof_index().remove(path)
+
+
+def _proof_refs(history):
+    """Bir karakterin geçmişindeki kanıtlar: aktivite id -> (yol, durum, reddedilme tarihi)."""
+    refs = {}
+    for entry in history:
+        path = entry.get("proof_image")
+        if path and not path.startswith(ARCHIVE_PREFIX):
+            # Eski kayıtlarda rejected_at yok: gönderim tarihi kullanılır
+            rejected_at = entry.get("rejected_at") or entry.get("date", "")
+            refs[entry.get("id")] = (path, entry.get("status"), rejected_at)
+    return refs
+
+
+def collect_garbage(now=None):
+    """
+    Tüm karakterleri sayfa sayfa tarayıp referansları yeniler; yetim ve uzun süredir
+    reddedilmiş dosyaları siler. Döner: {"orphans": n, "rejected": n, "freed_bytes": n}
+    Uygulamanın günlüğünde bekleyen (veritabanına henüz aktarılmamış) yazımlar da referans
+    sayılır; bekleyen yazımı olan öğrencilerin dosyalarına bu çalıştırmada dokunulmaz.
+    """
+    from journal import pending_payloads
+    from models import GameSystem
+
+    now = now or datetime.now()
+    by_character = {}  # isim -> {aktivite id: (yol, durum, reddedilme tarihi)}
+    for page in GameSystem.iter_character_pages():
+        for row in page:
+            by_character[row["name"]] = _proof_refs(row["data"].get("history", []))
+    busy = set()
+    for payload in pending_payloads():
+        # Bekleyen yazım daha günceldir (lean kayıtta sadece son aktiviteler bulunur)
+        busy.add(payload["name"])
+        by_character.setdefault(payload["name"], {}).update(
+            _proof_refs(payload["data"].get("history", [])))
+
+    references = {}   # yol -> [(sahip, aktivite id)]
+    statuses = {}     # yol -> [(durum, reddedilme tarihi)]
+    for name, refs in by_character.items():
+        for activity_id, (path, status, rejected_at) in refs.items():
+            references.setdefault(path, []).append((name, activity_id))
+            statuses.setdefault(path, []).append((status, rejected_at))
+
+    index = get_upload_index()
+    index.reconcile(references)
+
+    result = {"orphans": 0, "rejected": 0, "freed_bytes": 0}
+    orphan_cutoff = (now - timedelta(hours=ORPHAN_GRACE_HOURS)).timestamp()
+    rejected_cutoff = (now - timedelta(days=REJECTED_RETENTION_DAYS)).isoformat()
+    for path, entry in list(index.entries.items()):
+        if entry["owner"] in busy:
+            continue
+        if not entry["refs"]:
+            if entry["created"] < orphan_cutoff:
+                _delete_upload(path)
+                result["orphans"] += 1
+                result["freed_bytes"] += entry["size"]
+        elif all(status == "rejected" and rejected_at < rejected_cutoff for status, rejected_at in statuses.get(path, [])):
+            _delete_upload(path)
+            result["rejected"] += 1
+            result["freed_bytes"] += entry["size"]
+    return result
+
+
+def archive_old_proofs(now=None):
+    """
+    ARCHIVE_AFTER_DAYS'ten eski onaylı aktivitelerin kanıtlarını aylık zip paketlerine taşır
+    ve aktivitedeki yolu günceller. Taşınan dosya sayısını döner.
+    Karakter doğrudan veritabanına yazılır (uygulamanın günlüğü kullanılmaz); orijinal dosya
+    ancak yazım başarılı olduktan sonra silinir. Uygulamanın günlüğünde bekleyen yazımı olan
+    karakterler atlanır, bir sonraki çalıştırmada arşivlenir.
+    """
+    from journal import pending_names
+    from models import Character, GameSystem
+
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    index = get_upload_index()
+    busy = pending_names()
+    moved = 0
+
+    for page in GameSystem.iter_character_pages():
+        for row in page:
+            if row["name"] in busy:
+                continue
+            archived = []  # (eski yol, arşiv yolu)
+            for entry in row["data"].get("history", []):
+                path = entry.get("proof_image")
+                if (not path or path.startswith(ARCHIVE_PREFIX) or entry.get("status") != "approved"
+                        or entry.get("date", "") >= cutoff or not os.path.exists(path)):
+                    continue
+                bundle = os.path.join(ARCHIVE_DIR, f"{entry['date'][:7]}.zip")
+                with zipfile.ZipFile(bundle, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+                    member = os.path.basename(path)
+                    if member in zf.namelist():
+                        member = f"{uuid.uuid4().hex[:8]}_{member}"
+                    zf.write(path, member)
+                entry["proof_image"] = f"{ARCHIVE_PREFIX}{bundle}::{member}"
+                archived.append((path, entry["proof_image"]))
+            if not archived:
+                continue
+            GameSystem.save_character(Character.from_dict(row["data"]), direct=True)
+            for path, archived_path in archived:
+                os.remove(path)
+                index.remove(path)
+                get_proof_index().rename(path, archived_path)
+            moved += len(archived)
+    return moved
+
+
+if __name__ == "__main__":
+    # python storage.py gc|archive|stats
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "gc":
+        result = collect_garbage()
+        print(f"Removed {result['orphans']} orphaned and {result['rejected']} rejected uploads "
+              f"({result['freed_bytes'] / 1024 / 1024:.1f} MB).")
+    elif command == "archive":
+        print(f"Archived {archive_old_proofs()} proofs into {ARCHIVE_DIR}.")
+    elif command == "stats":
+        stats = get_upload_index().stats()
+        print(f"{stats['files']} files, {stats['bytes'] / 1024 / 1024:.1f} MB")
+        for owner, used in sorted(stats["usage"].items(), key=lambda item: -item[1])[:20]:
+            print(f"  {owner or '-'}: {used / 1024 / 1024:.1f} MB")
+    else:
+        print("Usage: python storage.py gc|archive|stats")
+        sys.exit(1)